@@ -5,6 +5,7 @@
 """
 
 from pathlib import Path
+import os
 import sys
 import re
 import argparse
@@ -18,6 +19,12 @@ from amaranth.back import verilog
 from mips.core.cpu import CPU
 from mips.memory.memory_file import MemoryFile
 
+# 源码位置注释的匹配模式在模块加载时编译一次
+SRC_ATTR_RE = re.compile(r'\(\* src = "([^"]*)" \*\)')
+SRC_ATTR_LINE_RE = re.compile(r'\(\* src = "[^"]*" \*\)\n')
+# 绝大多数路径都以项目根目录开头，直接切掉前缀即可得到相对路径
+PROJECT_ROOT_PREFIX = str(PROJECT_ROOT) + os.sep
+
 
 def process_verilog_paths(verilog_text: str, strip_paths: bool = False) -> str:
     """
@@ -32,14 +39,17 @@ def process_verilog_paths(verilog_text: str, strip_paths: bool = False) -> str:
     """
     if strip_paths:
         # 移除所有包含 src = "..." 的注释行
-        verilog_text = re.sub(r'\(\* src = "[^"]*" \*\)\n', '', verilog_text)
+        verilog_text = SRC_ATTR_LINE_RE.sub('', verilog_text)
     else:
         # 将绝对路径转换为相对路径
-        project_root_str = str(PROJECT_ROOT).replace('\\', '\\\\')
+        prefix_len = len(PROJECT_ROOT_PREFIX)
+
         # 匹配形如 (* src = "D:\Code\MIPS\..." *) 的注释
         def replace_path(match):
             full_path = match.group(1)
-            # 尝试转换为相对路径
+            if full_path.startswith(PROJECT_ROOT_PREFIX):
+                return f'(* src = "{full_path[prefix_len:]}" *)'
+            # 前缀不匹配时再尝试按路径语义转换
             try:
                 rel_path = Path(full_path).relative_to(PROJECT_ROOT)
                 return f'(* src = "{rel_path}" *)'
@@ -47,7 +57,7 @@ def process_verilog_paths(verilog_text: str, strip_paths: bool = False) -> str:
                 # 如果无法转换，保持原样
                 return match.group(0)
 
-        verilog_text = re.sub(r'\(\* src = "([^"]*)" \*\)', replace_path, verilog_text)
+        verilog_text = SRC_ATTR_RE.sub(replace_path, verilog_text)
 
     return verilog_text
 
@@ -60,19 +70,8 @@ def generate_cpu_verilog(output_dir="build/verilog", strip_paths=False):
     print("生成 CPU Verilog 代码...")
     cpu = CPU()
 
-    # 使用 Amaranth 的 verilog 后端生成代码
-    verilog_text = verilog.convert(
-        cpu,
-        name="CPU",
-        ports=[
-            cpu.imem_addr,
-            cpu.imem_rdata,
-            cpu.dmem_addr,
-            cpu.dmem_wdata,
-            cpu.dmem_wen,
-            cpu.dmem_rdata,
-        ],
-    )
+    # 使用 Amaranth 的 verilog 后端生成代码（端口取自组件签名）
+    verilog_text = verilog.convert(cpu, name="CPU")
 
     # 处理文件路径
     verilog_text = process_verilog_paths(verilog_text, strip_paths)
@@ -86,7 +85,7 @@ def generate_cpu_verilog(output_dir="build/verilog", strip_paths=False):
     return output_file
 
 
-def generate_memory_verilog(output_dir="build/verilog", strip_paths=False, memory_depth=4096, simplify_init=False):
+def generate_memory_verilog(output_dir="build/verilog", strip_paths=False, memory_depth=4096, simplify_init=False, hex_init=False):
     """生成 MemoryFile 的 Verilog 代码"""
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -94,23 +93,22 @@ def generate_memory_verilog(output_dir="build/verilog", strip_paths=False, memor
     print(f"\n生成 MemoryFile Verilog 代码 (深度: {memory_depth})...")
     memory = MemoryFile(depth=memory_depth)
 
-    # 使用 Amaranth 的 verilog 后端生成代码
-    verilog_text = verilog.convert(
-        memory,
-        name="MemoryFile",
-        ports=[
-            memory.addr,
-            memory.read_data,
-            memory.write_data,
-            memory.write_enable,
-        ],
-    )
+    # 使用 Amaranth 的 verilog 后端生成代码（端口取自组件签名）
+    verilog_text = verilog.convert(memory, name="MemoryFile")
 
     # 处理文件路径
     verilog_text = process_verilog_paths(verilog_text, strip_paths)
 
     # 简化重复的初始化代码
-    if simplify_init:
+    if hex_init:
+        hex_file = output_path / MEMORY_HEX_NAME
+        verilog_text, hex_text = externalize_memory_init(
+            verilog_text, memory_depth, MEMORY_HEX_NAME
+        )
+        with open(hex_file, "w", encoding="utf-8") as f:
+            f.write(hex_text)
+        print(f"✓ 存储器初值已写入: {hex_file}")
+    elif simplify_init:
         verilog_text = simplify_memory_init(verilog_text, memory_depth)
 
     # 写入文件
@@ -122,10 +120,28 @@ def generate_memory_verilog(output_dir="build/verilog", strip_paths=False, memor
     return output_file
 
 
+ZERO_INIT_PREFIX = "    mem["
+ZERO_INIT_SUFFIX = "] = 32'd0;"
+MEMORY_HEX_NAME = "memory_file.hex"
+
+
+def _is_zero_init(line: str) -> bool:
+    """判断一行是否为 mem[<数字>] = 32'd0; 形式的清零语句。"""
+    return (
+        line.startswith(ZERO_INIT_PREFIX)
+        and line.endswith(ZERO_INIT_SUFFIX)
+        and line[len(ZERO_INIT_PREFIX):-len(ZERO_INIT_SUFFIX)].isdigit()
+    )
+
+
 def simplify_memory_init(verilog_text: str, depth: int) -> str:
     """
     简化内存初始化代码，将大量重复的 mem[i] = 32'd0 替换为循环
 
+    Amaranth 的 Memory 总是带有初值（默认全 0），Yosys 会逐项写出
+    initial 语句，无法在生成阶段省略，因此这里按行单遍扫描替换，
+    避免对数千行的重复块做正则回溯匹配。
+
     Args:
         verilog_text: 原始 Verilog 代码
         depth: 内存深度
@@ -133,23 +149,79 @@ def simplify_memory_init(verilog_text: str, depth: int) -> str:
     Returns:
         简化后的 Verilog 代码
     """
-    # 查找 initial begin ... end 块中的重复初始化
-    # 匹配形如 mem[0] = 32'd0; mem[1] = 32'd0; ... 的模式
-
-    # 使用正则表达式找到 initial begin 和 end 之间的内容
-    init_pattern = r'(  initial begin\n)((?:    mem\[\d+\] = 32\'d0;\n)+)(  end)'
-
-    def replace_init(match):
-        prefix = match.group(1)
-        suffix = match.group(3)
-
-        # 生成简洁的初始化代码
-        replacement = f"{prefix}    integer i;\n    for (i = 0; i < {depth}; i = i + 1)\n      mem[i] = 32'd0;\n{suffix}"
-        return replacement
+    lines = verilog_text.split("\n")
+    result = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line == "  initial begin":
+            # 找到 initial begin 之后连续的清零语句
+            j = i + 1
+            while j < len(lines) and _is_zero_init(lines[j]):
+                j += 1
+            if j > i + 1 and j < len(lines) and lines[j].startswith("  end"):
+                result += [
+                    line,
+                    "    integer i;",
+                    f"    for (i = 0; i < {depth}; i = i + 1)",
+                    "      mem[i] = 32'd0;",
+                ]
+                i = j
+                continue
+        result.append(line)
+        i += 1
+
+    return "\n".join(result)
+
+
+def _parse_init(line: str):
+    """解析 mem[<地址>] = 32'd<值>; 形式的初始化语句，不匹配时返回 None。"""
+    if not (line.startswith(ZERO_INIT_PREFIX) and line.endswith(";")):
+        return None
+    index, sep, value = line[len(ZERO_INIT_PREFIX):-1].partition("] = 32'd")
+    if not (sep and index.isdigit() and value.isdigit()):
+        return None
+    return int(index), int(value)
+
+
+def externalize_memory_init(verilog_text: str, depth: int, hex_name: str) -> tuple[str, str]:
+    """
+    把逐项初始化的 initial 块替换为 $readmemh，初值另存为十六进制文件
 
-    verilog_text = re.sub(init_pattern, replace_init, verilog_text)
+    Args:
+        verilog_text: 原始 Verilog 代码
+        depth: 内存深度
+        hex_name: $readmemh 读取的文件名（相对仿真/综合工具的工作目录）
 
-    return verilog_text
+    Returns:
+        (处理后的 Verilog 代码, 十六进制初值文件内容)
+    """
+    lines = verilog_text.split("\n")
+    words = [0] * depth
+    result = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line == "  initial begin":
+            j = i + 1
+            entries = []
+            while j < len(lines):
+                entry = _parse_init(lines[j])
+                if entry is None:
+                    break
+                entries.append(entry)
+                j += 1
+            if entries and j < len(lines) and lines[j] == "  end":
+                for index, value in entries:
+                    words[index] = value
+                result.append(f'  initial $readmemh("{hex_name}", mem);')
+                i = j + 1
+                continue
+        result.append(line)
+        i += 1
+
+    hex_text = "".join(f"{word:08x}\n" for word in words)
+    return "\n".join(result), hex_text
 
 
 def main():
@@ -170,6 +242,9 @@ def main():
   # 简化初始化（使用 for 循环，文件更小但可能影响综合）
   python generate_verilog.py --simplify
 
+  # 初值另存为 memory_file.hex，Verilog 中用 $readmemh 加载
+  python generate_verilog.py --hex-init
+
   # 指定输出目录
   python generate_verilog.py --output build/rtl
         """
@@ -200,6 +275,12 @@ def main():
         help="简化内存初始化代码（使用 for 循环代替重复语句）"
     )
 
+    parser.add_argument(
+        "--hex-init",
+        action="store_true",
+        help="将内存初值写入 memory_file.hex 并用 $readmemh 加载（优先于 --simplify）"
+    )
+
     args = parser.parse_args()
 
     print("=" * 60)
@@ -219,7 +300,8 @@ def main():
             args.output,
             args.strip_paths,
             args.memory_depth,
-            args.simplify
+            args.simplify,
+            args.hex_init,
         )
 
         print("\n" + "=" * 60)
@@ -2,11 +2,12 @@
 
 import argparse
 import sys
+from array import array
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
-from amaranth import Mux
 from amaranth import Module
 from amaranth.lib import wiring
 from amaranth.lib.wiring import In, Out
@@ -19,7 +20,7 @@ from program.harming import build_hamming_program
 OUTPUT_BASE_ADDR = 0xFFFF0000
 PIPELINE_DRAIN_CYCLES = 12
 DEFAULT_MAX_CYCLES = 4000
-JR_RA_ENCODING = ((Opcode.R_TYPE & 0x3F) << 26) | (31 << 21) | (Funct.JR & 0x3F)
+JR_RA_ENCODING = int(((Opcode.R_TYPE & 0x3F) << 26) | (31 << 21) | (Funct.JR & 0x3F))
 PROJECT_ROOT = Path(__file__).resolve().parent
 ANALYSIS_DIR = PROJECT_ROOT / "build" / "analysis"
 
@@ -32,34 +33,34 @@ class MemoryWrite:
 
 
 class HammingSystem(wiring.Component):
-    """CPU + instruction memory hook for running the Hamming test program."""
+    """CPU + instruction memory preloaded with the Hamming test program."""
 
-    imem_init_addr: In(32)
-    imem_init_data: In(32)
-    imem_init_we: In(1)
     reset: In(1)
 
     debug_pc: Out(32)
     debug_instr: Out(32)
 
-    def __init__(self, *, imem_depth: int):
+    def __init__(self, program: Sequence[int], *, imem_depth: int):
         super().__init__()
+        self._program = list(program)
         self._imem_depth = imem_depth
 
     def elaborate(self, platform):  # noqa: D401 - interface required by amaranth
         m = Module()
         self.cpu = cpu = CPU()
         m.submodules.cpu = cpu
-        m.submodules.imem = imem = MemoryFile(depth=self._imem_depth, sync_read=False)
+        # The program is baked into the memory's initial contents, so no loader
+        # ports or upload cycles are needed before releasing reset.
+        m.submodules.imem = imem = MemoryFile(
+            depth=self._imem_depth,
+            sync_read=True,
+            transparent=False,
+            init=self._program,
+        )
 
-        # Instruction memory loader muxes: during init we drive addr/data manually.
-        word_addr = cpu.imem_addr >> 2
         m.d.comb += [
             cpu.reset.eq(self.reset),
-            imem.read_addr.eq(Mux(self.imem_init_we, self.imem_init_addr, word_addr)),
-            imem.write_addr.eq(self.imem_init_addr),
-            imem.write_data.eq(self.imem_init_data),
-            imem.write_enable.eq(self.imem_init_we),
+            imem.read_addr.eq(cpu.imem_addr >> 2),
             cpu.imem_rdata.eq(imem.read_data),
             cpu.dmem_rdata.eq(0),
             self.debug_pc.eq(cpu.imem_addr),
@@ -69,10 +70,15 @@ class HammingSystem(wiring.Component):
         return m
 
 
+# Maps every printable ASCII byte (0x20..0x7E) to 0x01 and everything else to 0x00.
+PRINTABLE_TABLE = bytes(1 if 32 <= b <= 126 else 0 for b in range(256))
+ALL_PRINTABLE = b"\x01" * 4
+
+
 def decode_ascii(value: int) -> Optional[str]:
-    value &= 0xFFFFFFFF
-    raw = value.to_bytes(4, byteorder="big")
-    if all(32 <= b <= 126 for b in raw):
+    raw = (value & 0xFFFFFFFF).to_bytes(4, byteorder="big")
+    # bytes.translate does the per-byte classification in C.
+    if raw.translate(PRINTABLE_TABLE) == ALL_PRINTABLE:
         return raw.decode("ascii")
     return None
 
@@ -84,30 +90,20 @@ def format_word(value: int) -> str:
     return f"0x{value & 0xFFFFFFFF:08X} ('{text}')"
 
 
-async def load_program(ctx, dut: HammingSystem, words: List[int]) -> None:
-    ctx.set(dut.imem_init_we, 0)
-    for idx, word in enumerate(words):
-        ctx.set(dut.imem_init_addr, idx)
-        ctx.set(dut.imem_init_data, word)
-        ctx.set(dut.imem_init_we, 1)
-        await ctx.tick()
-    ctx.set(dut.imem_init_we, 0)
-    await ctx.tick()
-
-
 def run_hamming(
-    max_cycles: int, vcd_path: Optional[str], expected_tests: int
-) -> Tuple[List[MemoryWrite], int, List[Tuple[int, int]], List[int]]:
+    max_cycles: int,
+    vcd_path: Optional[str],
+    expected_tests: int,
+    collect_perf: bool = True,
+) -> Tuple[List[MemoryWrite], int, Sequence[int], List[int]]:
     artifact = build_hamming_program()
     imem_depth = max(256, len(artifact.words) + 8)
-    dut = HammingSystem(imem_depth=imem_depth)
+    dut = HammingSystem(artifact.words, imem_depth=imem_depth)
     writes: List[MemoryWrite] = []
 
     async def bench(ctx):
         ctx.set(dut.reset, 1)
-        await load_program(ctx, dut, artifact.words)
-        for _ in range(3):
-            await ctx.tick()
+        await ctx.tick().repeat(3)
         ctx.set(dut.reset, 0)
 
         idle_cycles = 0
@@ -117,34 +113,53 @@ def run_hamming(
         jr_seen = 0
         drain = 0
         retired = 0
-        perf_samples: List[Tuple[int, int]] = []
+        # Retired-instruction count per cycle, indexed by cycle and preallocated up front.
+        # Only needed for the performance plot, so skipped entirely when it is off.
+        perf_samples = array("I", [0]) * (max_cycles if collect_perf else 0)
         jr_events: List[int] = []
+
+        # Bind per-cycle signals and methods to locals so the hot loop avoids attribute lookups.
+        get = ctx.get
+        tick = ctx.tick
+        pc_signal = dut.debug_pc
+        instr_signal = dut.debug_instr
+        dmem_wen = dut.cpu.dmem_wen
+        dmem_write_addr = dut.cpu.dmem_write_addr
+        dmem_wdata = dut.cpu.dmem_wdata
+        reg_wr_en = dut.cpu.regfile.wr_en
+        reg_wr_addr = dut.cpu.regfile.wr_addr
+        done_pc = artifact.done_pc
+        jr_ra = JR_RA_ENCODING
+        append_write = writes.append
+
         for cycle in range(max_cycles):
-            await ctx.tick()
+            await tick()
             cycles_executed = cycle + 1
-            pc = ctx.get(dut.debug_pc)
-            if pc == artifact.done_pc:
+            pc = get(pc_signal)
+            if pc == done_pc:
                 idle_cycles += 1
             else:
                 idle_cycles = 0
 
-            if ctx.get(dut.cpu.dmem_wen):
-                addr = ctx.get(dut.cpu.dmem_write_addr) & 0xFFFFFFFF
-                data = ctx.get(dut.cpu.dmem_wdata) & 0xFFFFFFFF
-                writes.append(MemoryWrite(cycle=cycle, addr=addr, data=data))
+            if get(dmem_wen):
+                addr = get(dmem_write_addr) & 0xFFFFFFFF
+                data = get(dmem_wdata) & 0xFFFFFFFF
+                append_write(MemoryWrite(cycle=cycle, addr=addr, data=data))
 
-            if ctx.get(dut.cpu.regfile.wr_en):
-                dest = ctx.get(dut.cpu.regfile.wr_addr)
+            if get(reg_wr_en):
+                dest = get(reg_wr_addr)
                 if dest != 0:
                     retired += 1
 
-            perf_samples.append((cycle, retired))
+            if collect_perf:
+                perf_samples[cycle] = retired
 
-            instr = ctx.get(dut.debug_instr) & 0xFFFFFFFF
-            if instr == JR_RA_ENCODING:
+            # debug_instr is an unsigned 32-bit port, so no masking is needed.
+            if get(instr_signal) == jr_ra:
                 if not jr_active:
                     jr_seen += 1
-                    jr_events.append(cycle)
+                    if collect_perf:
+                        jr_events.append(cycle)
                     drain = PIPELINE_DRAIN_CYCLES
                 jr_active = True
             else:
@@ -166,7 +181,7 @@ def run_hamming(
             )
 
         bench.cycles = cycles_executed
-        bench.samples = perf_samples
+        bench.samples = perf_samples[:cycles_executed]
         bench.jr_events = jr_events
 
     bench.cycles = 0
@@ -215,10 +230,17 @@ def main(argv: Optional[List[str]] = None) -> int:
         default=3,
         help="Number of JR-returning testcases to wait for (<=0 disables the limit).",
     )
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        help="Skip the pipeline/performance SVGs and the per-cycle sampling they need.",
+    )
     args = parser.parse_args(argv)
 
     try:
-        writes, cycles, samples, jr_events = run_hamming(args.max_cycles, args.vcd, args.tests)
+        writes, cycles, samples, jr_events = run_hamming(
+            args.max_cycles, args.vcd, args.tests, collect_perf=not args.no_plots
+        )
     except RuntimeError as exc:
         print(f"[ERROR] {exc}")
         return 1
@@ -257,6 +279,9 @@ def main(argv: Optional[List[str]] = None) -> int:
         else:
             print("  code   : <missing>")
 
+    if args.no_plots:
+        return 0
+
     ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
     pipeline_path = ANALYSIS_DIR / "pipeline.svg"
     perf_path = ANALYSIS_DIR / "performance.svg"
@@ -276,7 +301,9 @@ def svg_header(width: int, height: int) -> List[str]:
     ]
 
 
-def generate_pipeline_svg(path: Path) -> None:
+@lru_cache(maxsize=1)
+def pipeline_svg() -> str:
+    """Render the static 5-stage pipeline diagram once; the result never changes."""
     width, height = 900, 220
     stages = [
         ("IF", "取指 (Instruction Fetch)"),
@@ -292,6 +319,8 @@ def generate_pipeline_svg(path: Path) -> None:
     y = (height - box_height) / 2
 
     parts = svg_header(width, height)
+    # Arrow marker
+    parts.append("  <defs><marker id='arrow' markerWidth='10' markerHeight='10' refX='6' refY='3' orient='auto'><path d='M0,0 L0,6 L9,3 z' fill='#006064'/></marker></defs>")
     for idx, (name, desc) in enumerate(stages):
         x = margin + idx * (box_width + gap)
         parts.append(
@@ -310,24 +339,25 @@ def generate_pipeline_svg(path: Path) -> None:
                 f"  <line x1='{x + box_width:.1f}' y1='{y + box_height / 2:.1f}' x2='{x2:.1f}' y2='{y + box_height / 2:.1f}' stroke='#006064' stroke-width='3' marker-end='url(#arrow)'/>"
             )
 
-    # Arrow marker
-    parts.insert(2, "  <defs><marker id='arrow' markerWidth='10' markerHeight='10' refX='6' refY='3' orient='auto'><path d='M0,0 L0,6 L9,3 z' fill='#006064'/></marker></defs>")
     parts.append("</svg>")
+    return "\n".join(parts)
 
+
+def generate_pipeline_svg(path: Path) -> None:
     with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(parts))
+        f.write(pipeline_svg())
 
 
 def generate_performance_svg(
-    path: Path, samples: List[Tuple[int, int]], writes: List[MemoryWrite], jr_events: List[int]
+    path: Path, samples: Sequence[int], writes: List[MemoryWrite], jr_events: List[int]
 ) -> None:
     if not samples:
         return
 
     width, height = 960, 360
     margin = 60
-    max_cycle = max(c for c, _ in samples) or 1
-    max_retired = max(r for _, r in samples) or 1
+    max_cycle = (len(samples) - 1) or 1
+    max_retired = max(samples) or 1
 
     def sx(cycle: int) -> float:
         return margin + (cycle / max_cycle) * (width - 2 * margin)
@@ -349,7 +379,14 @@ def generate_performance_svg(
         f"  <text x='{margin - 35}' y='{margin - 10}' text-anchor='start' transform='rotate(-90 {margin - 35},{margin - 10})'>Retired Instructions (0~{max_retired})</text>"
     )
 
-    points = " ".join(f"{sx(c):.2f},{sy(r):.2f}" for c, r in samples)
+    # Inline the sx/sy arithmetic: one format per point instead of two closure calls.
+    x_span = width - 2 * margin
+    y_base = height - margin
+    y_span = height - 2 * margin
+    points = " ".join(
+        f"{margin + (c / max_cycle) * x_span:.2f},{y_base - (r / max_retired) * y_span:.2f}"
+        for c, r in enumerate(samples)
+    )
     parts.append(
         f"  <polyline fill='none' stroke='#2E7D32' stroke-width='2.5' points='{points}'/>"
     )
@@ -1,13 +1,26 @@
 from amaranth import *
 from amaranth.lib import wiring
 from amaranth.lib.wiring import In, Out
+from enum import IntEnum
+
+
+class ALUOp(IntEnum):
+    """ALU运算在独热操作码中的位序：op 的第 n 位为 1 即选择该运算"""
+
+    ADD = 0
+    SUB = 1
+    AND = 2
+    OR = 3
+    SLT = 4
+    SLL = 5
+    SRL = 6
 
 
 class ALU(wiring.Component):
     a: In(signed(32))
     b: In(signed(32))
     shamt: In(5)
-    op: In(4)
+    op: In(len(ALUOp))  # 独热码，由译码阶段给出，ALU内部不再译码
     result: Out(signed(32))
     zero: Out(1)
     negative: Out(1)
@@ -18,29 +31,33 @@ class ALU(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        result = Signal(signed(33))
-        with m.Switch(self.op):
-            with m.Case(0b0000):  # Add
-                m.d.comb += result.eq(self.a + self.b)
-            with m.Case(0b0001):  # Subtract
-                m.d.comb += result.eq(self.a - self.b)
-            with m.Case(0b0010):  # AND
-                m.d.comb += result.eq(self.a & self.b)
-            with m.Case(0b0011):  # OR
-                m.d.comb += result.eq(self.a | self.b)
-            with m.Case(0b0100):  # SLT
-                m.d.comb += result.eq(Mux(self.a < self.b, 1, 0))
-            with m.Case(0b0101):  # SLL
-                m.d.comb += result.eq(self.b << self.shamt)
-            with m.Case(0b0110):  # SRL - logical shift right
-                m.d.comb += result.eq(self.b.as_unsigned() >> self.shamt)
-
-        # 赋值给输出（隐式截断到32位）
+        # 加减法共用一个 32 位加法器：减法时对 b 取反并把进位输入置 1
+        subtract = Signal()
+        m.d.comb += subtract.eq(self.op[ALUOp.SUB])
+        b_operand = self.b.as_unsigned() ^ subtract.replicate(32)
+        add_sub = Signal(32)
+        m.d.comb += add_sub.eq(self.a.as_unsigned() + b_operand + subtract)
+
+        # 各运算结果并行算出，按独热码的对应位屏蔽后相或，无需再译码或优先级选择
+        candidates = [
+            (self.op[ALUOp.ADD] | self.op[ALUOp.SUB], add_sub),
+            (self.op[ALUOp.AND], self.a & self.b),
+            (self.op[ALUOp.OR], self.a | self.b),
+            (self.op[ALUOp.SLT], self.a < self.b),
+            (self.op[ALUOp.SLL], (self.b << self.shamt)[:32]),
+            (self.op[ALUOp.SRL], self.b.as_unsigned() >> self.shamt),  # 逻辑右移
+        ]
+        selected = Const(0, 32)
+        for enable, value in candidates:
+            selected = selected | (value.as_unsigned() & enable.replicate(32))
+        result = Signal(signed(32))
+        m.d.comb += result.eq(selected)
+
         m.d.comb += self.result.eq(result)
 
-        # 标志位（统一计算，避免多驱动）
-        m.d.comb += self.zero.eq(self.result == 0)
-        m.d.comb += self.negative.eq(self.result < 0)
+        # 标志位直接由内部 result 求得；符号只看最高位，无需比较器
+        m.d.comb += self.zero.eq(result == 0)
+        m.d.comb += self.negative.eq(result[31])
 
         return m
 
@@ -56,49 +73,53 @@ def to_signed_32(value):
 def _self_test() -> None:
     """Run a quick randomized self-test when invoked directly."""
     from amaranth.sim import Simulator
+    import contextlib
     import random
 
+    from mips.trace import trace_enabled
+
     dut = ALU()
 
+    # 每种运算的操作数和期望结果在仿真前一次算好，bench 中只剩驱动和比较
+    reference = [
+        (ALUOp.ADD, lambda a, b: a + b),
+        (ALUOp.SUB, lambda a, b: a - b),
+        (ALUOp.AND, lambda a, b: a & b),
+        (ALUOp.OR, lambda a, b: a | b),
+    ]
+    vectors = []
+    for op, model in reference:
+        a_values = [random.randint(-(2**31), 2**31 - 1) for _ in range(10000)]
+        b_values = [random.randint(-(2**31), 2**31 - 1) for _ in range(10000)]
+        # a 和 b 打包成 Cat(a, b) 的位模式，每组操作数只需一次 ctx.set
+        operands = [
+            (a & 0xFFFFFFFF) | ((b & 0xFFFFFFFF) << 32)
+            for a, b in zip(a_values, b_values)
+        ]
+        expected = [to_signed_32(model(a, b)) for a, b in zip(a_values, b_values)]
+        vectors.append((op, list(zip(operands, expected))))
+
     async def bench(ctx):
-        ctx.set(dut.op, 0b0000)  # Add
-        for _ in range(10000):
-            a = random.randint(-(2**31), 2**31 - 1)
-            b = random.randint(-(2**31), 2**31 - 1)
-            ctx.set(dut.a, a)
-            ctx.set(dut.b, b)
-            assert ctx.get(dut.result) == to_signed_32(a + b)
-
-        ctx.set(dut.op, 0b0001)  # Subtract
-        for _ in range(10000):
-            a = random.randint(-(2**31), 2**31 - 1)
-            b = random.randint(-(2**31), 2**31 - 1)
-            ctx.set(dut.a, a)
-            ctx.set(dut.b, b)
-            assert ctx.get(dut.result) == to_signed_32(a - b)
-
-        ctx.set(dut.op, 0b0010)  # AND
-        for _ in range(10000):
-            a = random.randint(-(2**31), 2**31 - 1)
-            b = random.randint(-(2**31), 2**31 - 1)
-            ctx.set(dut.a, a)
-            ctx.set(dut.b, b)
-            assert ctx.get(dut.result) == to_signed_32(a & b)
-
-        ctx.set(dut.op, 0b0011)  # OR
-        for _ in range(10000):
-            a = random.randint(-(2**31), 2**31 - 1)
-            b = random.randint(-(2**31), 2**31 - 1)
-            ctx.set(dut.a, a)
-            ctx.set(dut.b, b)
-            assert ctx.get(dut.result) == to_signed_32(a | b)
+        # 测试台中每次 ctx.set 都会让电路稳定一次，a/b 合并写入可减半求值次数
+        operand_bus = Cat(dut.a, dut.b)
+        for op, cases in vectors:
+            ctx.set(dut.op, 1 << op)
+            for operand, expected in cases:
+                ctx.set(operand_bus, operand)
+                assert ctx.get(dut.result) == expected
 
     sim = Simulator(dut)
     sim.add_testbench(bench)
-    with sim.write_vcd("ALU.vcd"):
+    # 只在设置 TRACE=1 时写出波形，纯断言运行不承担 VCD 记录开销
+    with sim.write_vcd("ALU.vcd") if trace_enabled() else contextlib.nullcontext():
         sim.run()
         print("ALU OK!")
 
 
 if __name__ == "__main__":
+    # 允许直接运行本文件（python mips/core/alu.py）
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
     _self_test()
@@ -2,22 +2,33 @@ from amaranth import *
 from amaranth.lib import wiring
 from amaranth.lib.wiring import In, Out, Signature
 from amaranth.lib.wiring import connect, flipped
-from amaranth.lib.coding import Encoder
+from amaranth.lib.memory import Memory
+from amaranth.utils import exact_log2
 from enum import IntEnum
 
-from .alu import ALU
+from .alu import ALU, ALUOp
 
 
-def _connect_interface(m, source, target, *, domain="comb"):
-    """Assign every field from one interface to another."""
-    drive = getattr(m.d, domain)
-    for name, member in target.signature.members.items():
-        src_field = getattr(source, name)
-        dst_field = getattr(target, name)
-        if isinstance(member.shape, Signature):
-            _connect_interface(m, src_field, dst_field, domain=domain)
-        else:
-            drive += dst_field.eq(src_field)
+def _interface_fields(interface):
+    """Return the leaf signals of an interface in signature order."""
+    return [value for _path, _flow, value in interface.signature.flatten(interface)]
+
+
+def _register_fields(m, sources, targets, *, enable=None):
+    """Register several fields through one packed flip-flop vector.
+
+    All fields are concatenated into one register updated by a single
+    synchronous assignment; the outputs are slices of it.
+    """
+    packed = Signal(sum(len(t) for t in targets))
+    update = packed.eq(Cat(*sources))
+    if enable is None:
+        m.d.sync += update
+    else:
+        with m.If(enable):
+            m.d.sync += update
+    m.d.comb += Cat(*targets).eq(packed)
+    return packed
 
 
 # ========== 操作码枚举 ==========
@@ -51,6 +62,14 @@ class Opcode(IntEnum):
     JAL = 0b000011
 
 
+# 带无关位的opcode分组模式（"-"为无关位），配合 Value.matches() 一次比较整组
+OPCODE_BRANCH = "00010-"  # BEQ/BNE，最低位为1表示BNE
+OPCODE_JUMP = "00001-"  # J/JAL
+
+# 全局分支历史长度，同时决定两级预测器PHT的表项数（2**BRANCH_HISTORY_BITS）
+BRANCH_HISTORY_BITS = 8
+
+
 # ========== R型指令功能码枚举 ==========
 class Funct(IntEnum):
     """6位功能码定义 (R型指令使用)"""
@@ -78,6 +97,75 @@ class Funct(IntEnum):
     JALR = 0b001001
 
 
+# ========== 译码控制表 ==========
+# 目标寄存器选择
+DEST_NONE, DEST_RD, DEST_RT, DEST_RA = range(4)
+
+# 控制字位序：Cat(alu_sel, mem_read, mem_write, reg_write, mem_to_reg, alu_op[7], dest_sel[2])
+# alu_op为独热码（位序见ALUOp），译码表直接给出ALU的选择信号
+ALU_OP_WIDTH = len(ALUOp)
+CONTROL_WIDTH = 5 + ALU_OP_WIDTH + 2
+
+
+def _pack_control(
+    *,
+    alu_sel=0,
+    mem_read=0,
+    mem_write=0,
+    reg_write=0,
+    mem_to_reg=0,
+    alu_op=ALUOp.ADD,
+    dest_sel=DEST_NONE,
+):
+    """把一条指令的控制信号打包为控制字。"""
+    return (
+        alu_sel
+        | (mem_read << 1)
+        | (mem_write << 2)
+        | (reg_write << 3)
+        | (mem_to_reg << 4)
+        | ((1 << alu_op) << 5)
+        | (dest_sel << (5 + ALU_OP_WIDTH))
+    )
+
+
+# 按opcode索引的控制字，未列出的opcode全部为0（不产生任何副作用）
+# R型指令的ALU操作和写回使能由FUNCT_CONTROL决定
+OPCODE_CONTROL = {
+    Opcode.R_TYPE: _pack_control(dest_sel=DEST_RD),
+    Opcode.ADDI: _pack_control(alu_sel=1, reg_write=1, alu_op=ALUOp.ADD, dest_sel=DEST_RT),
+    Opcode.ANDI: _pack_control(alu_sel=1, reg_write=1, alu_op=ALUOp.AND, dest_sel=DEST_RT),
+    Opcode.ORI: _pack_control(alu_sel=1, reg_write=1, alu_op=ALUOp.OR, dest_sel=DEST_RT),
+    Opcode.SLTI: _pack_control(alu_sel=1, reg_write=1, alu_op=ALUOp.SLT, dest_sel=DEST_RT),
+    Opcode.LW: _pack_control(
+        alu_sel=1, mem_read=1, reg_write=1, mem_to_reg=1, dest_sel=DEST_RT
+    ),
+    Opcode.SW: _pack_control(alu_sel=1, mem_write=1),
+    Opcode.JAL: _pack_control(reg_write=1, dest_sel=DEST_RA),
+}
+
+# R型指令按funct索引的控制字，格式与OPCODE_CONTROL相同
+# 未列出的funct按ADD处理并写回rd；JR不写寄存器
+FUNCT_CONTROL = {
+    Funct.ADD: _pack_control(reg_write=1, alu_op=ALUOp.ADD, dest_sel=DEST_RD),
+    Funct.SUB: _pack_control(reg_write=1, alu_op=ALUOp.SUB, dest_sel=DEST_RD),
+    Funct.AND: _pack_control(reg_write=1, alu_op=ALUOp.AND, dest_sel=DEST_RD),
+    Funct.OR: _pack_control(reg_write=1, alu_op=ALUOp.OR, dest_sel=DEST_RD),
+    Funct.SLT: _pack_control(reg_write=1, alu_op=ALUOp.SLT, dest_sel=DEST_RD),
+    Funct.SLL: _pack_control(reg_write=1, alu_op=ALUOp.SLL, dest_sel=DEST_RD),
+    Funct.SRL: _pack_control(reg_write=1, alu_op=ALUOp.SRL, dest_sel=DEST_RD),
+    Funct.JR: _pack_control(dest_sel=DEST_RD),
+}
+FUNCT_CONTROL_DEFAULT = FUNCT_CONTROL[Funct.ADD]
+
+# 统一译码表，按7位insn_code索引：
+#   insn_code = Cat(opcode, 0)  非R型指令，前64项
+#   insn_code = Cat(funct, 1)   R型指令，后64项
+DECODE_TABLE = [OPCODE_CONTROL.get(op, 0) for op in range(64)] + [
+    FUNCT_CONTROL.get(fn, FUNCT_CONTROL_DEFAULT) for fn in range(64)
+]
+
+
 # ========== PC 和寄存器文件类 ==========
 class PC(wiring.Component):
     """程序计数器"""
@@ -97,32 +185,13 @@ class PC(wiring.Component):
         pc_reg = Signal(30, reset=0)
 
         # 输出：拼接2个0到低位，恢复32位地址
-        m.d.comb += self.addr_out.eq(pc_reg << 2)
+        m.d.comb += self.addr_out.eq(Cat(Const(0, 2), pc_reg))
 
         # 更新逻辑：reset时复位到0，enable时写入新值
         with m.If(self.reset):
             m.d.sync += pc_reg.eq(0)
         with m.Elif(self.enable):
-            m.d.sync += pc_reg.eq(self.addr_in >> 2)
-
-        return m
-
-
-class PCController(wiring.Component):
-    input: In(PCControllerInput())
-    output: Out(PCRegisterInput())
-
-    def __init__(self):
-        super().__init__()
-
-    def elaborate(self, platform):
-        m = Module()
-
-        with m.If(self.input.stall == 1):
-            m.d.comb += self.output.enable.eq(0)
-        with m.Else():
-            m.d.comb += self.output.enable.eq(1)
-            m.d.comb += self.output.addr_in.eq(self.input.id_next_pc)
+            m.d.sync += pc_reg.eq(self.addr_in[2:32])
 
         return m
 
@@ -143,33 +212,67 @@ class RegFile(wiring.Component):
     wr_data: In(32)
     wr_en: In(1)
 
-    def __init__(self, depth=32):
+    def __init__(self, depth=32, sync_read=False):
         self.depth = depth
+        # 组合读：同一周期得到数据，CPU 的 ID 阶段依赖这一点
+        # 同步读：下一周期得到数据，便于综合工具映射到块 RAM
+        self.sync_read = sync_read
         super().__init__()
 
     def elaborate(self, platform):
+        if self.sync_read:
+            return self._elaborate_sync()
+
         m = Module()
-        regs = Array(Signal(32, name=f"r{i}", reset=0) for i in range(self.depth))
+        m.submodules.mem = mem = Memory(shape=32, depth=self.depth, init=[])
+        wp = mem.write_port(domain="sync")
+        rp0 = mem.read_port(domain="comb")
+        rp1 = mem.read_port(domain="comb")
+
+        # 寄存器0不可写，mem[0] 保持初值 0，因此读端口无需再判断 x0
+        write = Signal()
+        m.d.comb += write.eq(self.wr_en & (self.wr_addr != 0))
+        m.d.comb += [
+            wp.addr.eq(self.wr_addr),
+            wp.data.eq(self.wr_data),
+            wp.en.eq(write),
+            rp0.addr.eq(self.rd_addr0),
+            rp1.addr.eq(self.rd_addr1),
+        ]
 
-        # 读寄存器0时总是返回0
-        # 实现"写优先"：如果同时读写同一寄存器，返回写入的值
-        rd_data0_reg = Mux(self.rd_addr0 == 0, 0, regs[self.rd_addr0])
-        rd_data1_reg = Mux(self.rd_addr1 == 0, 0, regs[self.rd_addr1])
+        # 实现"写优先"：如果同时读写同一寄存器，返回写入的值；每个读端口一个2:1选择器
+        m.d.comb += [
+            self.rd_data0.eq(
+                Mux(write & (self.wr_addr == self.rd_addr0), self.wr_data, rp0.data)
+            ),
+            self.rd_data1.eq(
+                Mux(write & (self.wr_addr == self.rd_addr1), self.wr_data, rp1.data)
+            ),
+        ]
 
-        # 写优先转发
-        with m.If(self.wr_en & (self.wr_addr != 0) & (self.wr_addr == self.rd_addr0)):
-            m.d.comb += self.rd_data0.eq(self.wr_data)
-        with m.Else():
-            m.d.comb += self.rd_data0.eq(rd_data0_reg)
+        return m
 
-        with m.If(self.wr_en & (self.wr_addr != 0) & (self.wr_addr == self.rd_addr1)):
-            m.d.comb += self.rd_data1.eq(self.wr_data)
-        with m.Else():
-            m.d.comb += self.rd_data1.eq(rd_data1_reg)
+    def _elaborate_sync(self):
+        """Memory-backed variant with registered (one-cycle) read ports."""
+        m = Module()
+        m.submodules.mem = mem = Memory(shape=32, depth=self.depth, init=[])
 
-        # 连接写端口(寄存器0不可写)
-        with m.If(self.wr_en & (self.wr_addr != 0)):
-            m.d.sync += regs[self.wr_addr].eq(self.wr_data)
+        # 读端口对写端口透明：同一周期写入并读取同一地址时，
+        # 下一周期读出的是新写入的值（写优先）；读写不同地址互不影响
+        wp = mem.write_port(domain="sync")
+        rp0 = mem.read_port(domain="sync", transparent_for=[wp])
+        rp1 = mem.read_port(domain="sync", transparent_for=[wp])
+
+        m.d.comb += [
+            rp0.addr.eq(self.rd_addr0),
+            rp1.addr.eq(self.rd_addr1),
+            self.rd_data0.eq(rp0.data),
+            self.rd_data1.eq(rp1.data),
+            # 寄存器0不可写，mem[0] 保持初值 0
+            wp.addr.eq(self.wr_addr),
+            wp.data.eq(self.wr_data),
+            wp.en.eq(self.wr_en & (self.wr_addr != 0)),
+        ]
 
         return m
 
@@ -202,6 +305,25 @@ class PCControllerInput(Signature):
         )
 
 
+class PCController(wiring.Component):
+    input: In(PCControllerInput())
+    output: Out(PCRegisterInput())
+
+    def __init__(self):
+        super().__init__()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        with m.If(self.input.stall == 1):
+            m.d.comb += self.output.enable.eq(0)
+        with m.Else():
+            m.d.comb += self.output.enable.eq(1)
+            m.d.comb += self.output.addr_in.eq(self.input.id_next_pc)
+
+        return m
+
+
 class IFStageBus(Signature):
     """IF→ID流水寄存器总线：携带取出的指令和对应的PC。"""
 
@@ -210,7 +332,8 @@ class IFStageBus(Signature):
             {
                 "inst_word": Out(32),  # 取出的指令字
                 "next_pc": Out(32),  # 预测的下一条PC地址
-                "current_pc": Out(32),  # 当前指令的PC地址
+                "pc_plus4": Out(32),  # 当前指令的PC+4（顺序地址/链接地址/分支基址）
+                "history": Out(BRANCH_HISTORY_BITS),  # 预测该指令时的全局分支历史
             }
         )
 
@@ -225,17 +348,16 @@ class IDStageBus(Signature):
                 "rt_index": Out(5),  # 源/目的寄存器rt编号
                 "rs_value": Out(32),  # rs读出的数据
                 "rt_value": Out(32),  # rt读出的数据
-                "imm_value": Out(16),  # 立即数字段
+                "imm_value": Out(32),  # 已按指令类型零/符号扩展的立即数
                 "shift_amount": Out(5),  # 移位指令的shamt
                 # 控制信号
-                "alu_opcode": Out(4),  # ALU操作码
+                "alu_opcode": Out(ALU_OP_WIDTH),  # ALU操作（独热码）
                 "alu_operand_sel": Out(1),  # ALU第二操作数选择（立即数/寄存器）
                 "mem_read_en": Out(1),  # 数据存储器读使能
                 "mem_write_en": Out(1),  # 数据存储器写使能
                 "dest_reg": Out(5),  # 将要写回的目标寄存器
                 "reg_write_en": Out(1),  # 寄存器写回使能
                 "mem_to_reg_sel": Out(1),  # 写回数据来源（1=内存，0=ALU）
-                "next_pc": Out(32),  # ID阶段计算出的下一条PC
             }
         )
 
@@ -310,10 +432,10 @@ class ForwardingInput(Signature):
         super().__init__(
             {
                 # 当前操作数信息（每个ForwardingUnit独立）
-                "src_reg": In(5),  # ID或EX阶段当前需要的寄存器编号
-                "fallback_data": In(32),  # 未转发时可使用的寄存器读数值
+                "src_reg": Out(5),  # ID或EX阶段当前需要的寄存器编号
+                "fallback_data": Out(32),  # 未转发时可使用的寄存器读数值
                 # 共享的转发源
-                "forwarding_source": In(
+                "forwarding_source": Out(
                     ForwardingSourceBus()
                 ),  # EX/MEM与MEM/WB提供的转发信息
             }
@@ -330,6 +452,7 @@ class HazardDetectionSourceBus(Signature):
                 "id_ex_dest_reg": Out(5),  # load指令准备写入的寄存器
                 "id_ex_reg_write_en": Out(1),  # 当前ID/EX是否写回寄存器
                 "ex_mem_reg_write_en": Out(1),  # EX/MEM阶段是否写回
+                "ex_mem_mem_read_en": Out(1),  # EX/MEM阶段是否为load
                 "ex_mem_dest_reg": Out(5),  # EX/MEM阶段目的寄存器
             }
         )
@@ -342,10 +465,11 @@ class HazardDetectionInput(Signature):
         super().__init__(
             {
                 # 当前源寄存器
-                "if_id_src_reg": In(5),  # IF/ID 指令中的源寄存器（rs/rt）
-                "opcode": In(6),  # 当前指令操作码
+                "if_id_src_reg": Out(5),  # IF/ID 指令中的源寄存器（rs/rt）
+                "opcode": Out(6),  # 当前指令操作码
+                "funct": Out(6),  # 当前指令功能码（识别JR）
                 # 共享的load信息
-                "hazard_source": In(HazardDetectionSourceBus()),  # 来自ID/EX的load状态
+                "hazard_source": Out(HazardDetectionSourceBus()),  # 来自ID/EX的load状态
             }
         )
 
@@ -372,16 +496,30 @@ class ForwardingOutput(Signature):
         )
 
 
+def _saturating_step(counter, taken):
+    """Return the next value of a 2-bit saturating counter."""
+    # 跳转时在未满3时+1，不跳转时在未到0时-1，单个加法器完成
+    return counter + Mux(taken, counter != 3, -(counter != 0))
+
+
 class BranchTargetBuffer(wiring.Component):
-    """BTB"""
+    """直接映射的分支目标缓冲（BTB），保存跳转过的控制转移指令及其目标。
+
+    查找和更新都以分支指令的 PC+4 为键：IF 阶段本来就要计算 PC+4，
+    ID 阶段也只保存了 PC+4，这样两边都无需额外的加减法器。
+    只有跳转过的指令才会写入表项；条件分支的方向由 TwoLevelPredictor 预测，
+    J/JAL 标记为无条件跳转，命中即预测跳转。
+    """
 
     lookup_addr: In(32)
     hit: Out(1)
     target_addr: Out(32)
-    predicted: Out(1)
+    unconditional: Out(1)  # 表项是J/JAL，总是跳转
 
     update_addr: In(32)
     update_target: In(32)
+    update_unconditional: In(1)
+    update_taken: In(1)
     update_enable: In(1)
 
     def __init__(self, size=16):
@@ -391,42 +529,41 @@ class BranchTargetBuffer(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        index = Signal(self.size.bit_length(), reset=0)
-        tag_array = Array(
-            Signal(30, name=f"tag_{i}", reset=0) for i in range(self.size)
-        )
-        target_array = Array(
-            Signal(30, name=f"target_{i}", reset=0) for i in range(self.size)
-        )
-        predicted_array = Array(
-            Signal(1, name=f"predicted_{i}", reset=0) for i in range(self.size)
+        index_bits = exact_log2(self.size)
+        tag_bits = 30 - index_bits
+        # 表项位序：Cat(valid, unconditional, tag, target[30])
+        m.submodules.entries = entries = Memory(
+            shape=1 + 1 + tag_bits + 30, depth=self.size, init=[]
         )
+        lookup_port = entries.read_port(domain="comb")
+        write_port = entries.write_port(domain="sync")
 
-        lookup_match = Signal(self.size)
-        for i in range(self.size):
-            m.d.comb += lookup_match[i].eq(lookup_addr == (tag_array[i] << 2))
-
-        m.submodules.encoder = encoder = Encoder(self.size)
-        m.d.comb += encoder.i.eq(lookup_match)
-
-        m.d.comb += self.hit.eq(~encoder.n)
-        m.d.comb += self.predicted.eq(predicted_array[encoder.o])
-
-        with m.If(self.update_enable):
-            update_match = Signal(self.length)
-            for i in range(self.size):
-                m.d.comb += update_match[i].eq(update_addr == (tag_array[i] << 2))
-
-            m.submodules.encoder = encoder = Encoder(self.size)
-            m.d.comb += encoder.i.eq(update_match)
-
-            with m.If(encoder.n == 0):
-                m.d.sync += tag_array[index].eq(update_addr >> 2)
-                m.d.sync += target_array[index].eq(update_target >> 2)
-                m.d.sync += index.eq(index + 1)
+        # 查找（IF阶段）
+        lookup_word = self.lookup_addr[2:32]
+        m.d.comb += lookup_port.addr.eq(lookup_word[:index_bits])
+        data = lookup_port.data
+        m.d.comb += [
+            self.hit.eq(
+                data[0] & (data[2 : 2 + tag_bits] == lookup_word[index_bits:])
+            ),
+            self.unconditional.eq(data[1]),
+            self.target_addr.eq(Cat(Const(0, 2), data[2 + tag_bits :])),
+        ]
 
-            with m.Else():
-                m.d.sync += target_array[encoder.o].eq(update_target >> 2)
+        # 更新（ID阶段解析后）：跳转时分配/覆盖表项，不跳转时表项保持不变
+        update_word = self.update_addr[2:32]
+        m.d.comb += [
+            write_port.addr.eq(update_word[:index_bits]),
+            write_port.data.eq(
+                Cat(
+                    Const(1, 1),
+                    self.update_unconditional,
+                    update_word[index_bits:],
+                    self.update_target[2:32],
+                )
+            ),
+            write_port.en.eq(self.update_enable & self.update_taken),
+        ]
 
         return m
 
@@ -441,22 +578,22 @@ class InstructionFetchStage(wiring.Component):
     btb_predicted_taken: In(1)
 
     btb_lookup_addr: Out(32)
+    branch_history: In(BRANCH_HISTORY_BITS)  # 两级预测器当前的全局历史
 
     imem_addr: Out(32)
-    imem_data_in: In(32)
     flush_request: In(1)
     stall: In(1)
     reset: In(1)
 
-    # 使用Signature接口输出
+    # 使用Signature接口输出（inst_word由同步读的指令存储器在下一周期给出）
     output: Out(IFStageBus())
+    squash: Out(1)  # 本周期取出的指令需要作废（在IF/ID中替换为NOP）
 
     def __init__(self):
         super().__init__()
 
     def elaborate(self, platform):
         m = Module()
-        m.d.comb += self.btb_lookup_addr.eq(self.pc_current)
 
         # 保存前一个PC值，用于stall时重新取指
         prev_pc = Signal(32, reset=0)
@@ -465,37 +602,38 @@ class InstructionFetchStage(wiring.Component):
         with m.Elif(~self.stall):
             m.d.sync += prev_pc.eq(self.pc_current)
 
-        # 输出当前PC（供ID阶段使用）
-        # stall时使用prev_pc，因为当前指令还没被处理
-        with m.If(self.stall):
-            m.d.comb += self.output.current_pc.eq(prev_pc)
-        with m.Else():
-            m.d.comb += self.output.current_pc.eq(self.pc_current)
-
-        # 暂时禁用BTB预测，总是预测顺序执行
-        with m.If(self.btb_hit & (self.btb_predicted_taken == 1)):
-            m.d.comb += self.output.next_pc.eq(self.btb_predicted)
-        with m.Else():
-            m.d.comb += self.output.next_pc.eq(self.pc_current + 4)
+        # PC+4只在这里算一次：既是顺序预测地址，也随流水线传给ID阶段
+        # 作为分支基址和JAL链接地址。stall时IF/ID保持不变，无需选择prev_pc
+        pc_plus4 = Signal(32)
+        m.d.comb += pc_plus4.eq(self.pc_current + 4)
+        m.d.comb += self.output.pc_plus4.eq(pc_plus4)
+
+        # BTB命中且预测跳转（J/JAL或两级预测器判为跳转）时取预测目标，否则顺序执行
+        m.d.comb += self.btb_lookup_addr.eq(pc_plus4)
+        m.d.comb += self.output.history.eq(self.branch_history)
+        m.d.comb += self.output.next_pc.eq(
+            Mux(self.btb_hit & self.btb_predicted_taken, self.btb_predicted, pc_plus4)
+        )
 
-        # 指令内存地址：stall时使用prev_pc重新取同一条指令
-        with m.If(self.stall):
-            m.d.comb += self.imem_addr.eq(prev_pc)
-        with m.Else():
-            m.d.comb += self.imem_addr.eq(self.pc_current)
+        # 指令内存地址：stall时使用prev_pc重新取同一条指令，
+        # 同步读端口因此在stall期间保持IF/ID中的指令不变
+        m.d.comb += self.imem_addr.eq(Mux(self.stall, prev_pc, self.pc_current))
 
-        # 如果 reset 或 flush，输出NOP；否则输出读取的指令
-        with m.If(self.reset | self.flush_request):
-            m.d.comb += self.output.inst_word.eq(0)  # NOP instruction on reset/flush
-        with m.Else():
-            m.d.comb += self.output.inst_word.eq(self.imem_data_in)
+        # 如果 reset 或 flush，本次取出的指令作废
+        m.d.comb += self.squash.eq(self.reset | self.flush_request)
         return m
 
 
 class IFIDRegister(wiring.Component):
-    """IF/ID 流水寄存器：缓存取指阶段产生的指令和 PC。"""
+    """IF/ID 流水寄存器：缓存取指阶段产生的 PC。
+
+    指令字由同步读的指令存储器寄存，这里只需寄存 PC 和作废标志，
+    作废时把读出的指令替换为NOP。
+    """
 
     input: In(IFStageBus())
+    imem_data_in: In(32)  # 指令存储器读端口输出（已寄存）
+    squash: In(1)
     stall: In(1)  # 暂停信号
     output: Out(IFStageBus())
 
@@ -505,29 +643,68 @@ class IFIDRegister(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        with m.If(~self.stall):
-            _connect_interface(m, self.input, self.output, domain="sync")
+        squashed = Signal()
+        _register_fields(
+            m,
+            [self.input.pc_plus4, self.input.next_pc, self.input.history, self.squash],
+            [self.output.pc_plus4, self.output.next_pc, self.output.history, squashed],
+            enable=~self.stall,
+        )
+
+        m.d.comb += self.output.inst_word.eq(Mux(squashed, 0, self.imem_data_in))
         return m
 
 
-# class TwoBitPredictor(wiring.Component):
-#     """两位饱和计数分支预测器。"""
-#
-#     input_bit: In(1)
-#     output_bit: Out(1)
-#
-#     def __init__(self):
-#         super().__init__()
-#
-#     def elaborate(self, platform):
-#         m = Module()
-#         counter = Signal(2)
-#         with m.If(self.input_bit == 1):
-#             with m.If(counter != 3):
-#                 m.d.sync += counter.eq(counter + 1)
-#         with m.Else():
-#             with m.If(counter != 0):
-#                 m.d.sync += counter.eq(counter - 1)
+class TwoLevelPredictor(wiring.Component):
+    """两级相关分支预测器（gshare）。
+
+    全局分支历史寄存器（BHR）与分支的 PC+4 异或后索引一张两位饱和计数器表（PHT），
+    可以捕捉单独一张计数器表无法区分的循环出口和相关分支。
+    IF 阶段把查表时的历史快照随指令送到 ID，更新时用同一快照重新算出索引，
+    因此即便 BHR 在此期间已经前移，更新的仍是当初预测所用的计数器。
+    """
+
+    lookup_addr: In(32)
+    predicted: Out(1)  # 计数器高位：预测跳转
+    history: Out(BRANCH_HISTORY_BITS)  # 当前全局历史
+
+    update_addr: In(32)
+    update_history: In(BRANCH_HISTORY_BITS)  # 该分支预测时的历史快照
+    update_taken: In(1)
+    update_enable: In(1)
+
+    def __init__(self):
+        super().__init__()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        bits = BRANCH_HISTORY_BITS
+        bhr = Signal(bits)
+        # 计数器初值为弱跳转：只有跳转过的分支才会进入BTB，首次命中时倾向再次跳转
+        m.submodules.pht = pht = Memory(
+            shape=2, depth=1 << bits, init=[0b10] * (1 << bits)
+        )
+        lookup_port = pht.read_port(domain="comb")
+        update_port = pht.read_port(domain="comb")
+        write_port = pht.write_port(domain="sync")
+
+        m.d.comb += [
+            lookup_port.addr.eq(self.lookup_addr[2 : 2 + bits] ^ bhr),
+            self.predicted.eq(lookup_port.data[1]),
+            self.history.eq(bhr),
+        ]
+
+        m.d.comb += [
+            update_port.addr.eq(self.update_addr[2 : 2 + bits] ^ self.update_history),
+            write_port.addr.eq(update_port.addr),
+            write_port.data.eq(_saturating_step(update_port.data, self.update_taken)),
+            write_port.en.eq(self.update_enable),
+        ]
+        with m.If(self.update_enable):
+            m.d.sync += bhr.eq(Cat(self.update_taken, bhr[:-1]))
+
+        return m
 
 
 class HazardDetectionUnit(wiring.Component):
@@ -543,35 +720,24 @@ class HazardDetectionUnit(wiring.Component):
         # 提取共享源信号
         haz_src = self.input.hazard_source
 
-        # Load-Use冒险检测：ID/EX阶段是load指令且目标寄存器与当前源寄存器冲突
-        load_use_hazard = (
-            (haz_src.id_ex_mem_read_en == 1)  # ID/EX阶段是load指令
-            & (haz_src.id_ex_dest_reg != 0)  # 目标寄存器不是$0
-            & (haz_src.id_ex_dest_reg == self.input.if_id_src_reg)  # 寄存器冲突
-        )
-
-        # Branch Hazard检测：分支需要最新寄存器值，但ID阶段没有转发
-        is_branch = (self.input.opcode == Opcode.BEQ) | (
-            self.input.opcode == Opcode.BNE
-        )
-
-        branch_hazard_ex = (
-            is_branch
-            & (self.input.if_id_src_reg != 0)
-            & haz_src.id_ex_reg_write_en
-            & (haz_src.id_ex_dest_reg == self.input.if_id_src_reg)
+        # 源寄存器非$0时，分别与ID/EX、EX/MEM的目标寄存器比较一次，各冒险共用
+        src_reg = self.input.if_id_src_reg
+        match_id_ex = (src_reg != 0) & (haz_src.id_ex_dest_reg == src_reg)
+        match_ex_mem = (src_reg != 0) & (haz_src.ex_mem_dest_reg == src_reg)
+
+        # Load-Use冒险：ID/EX阶段是load指令且目标寄存器与当前源寄存器冲突
+        load_use_hazard = match_id_ex & haz_src.id_ex_mem_read_en
+
+        # Branch Hazard检测：分支比较和JR的目标都在ID阶段使用寄存器值，只能得到
+        # EX/MEM中已算好的ALU结果，仍在EX中计算的结果和EX/MEM中尚未读出的load数据都要等待
+        is_jr = (self.input.opcode == Opcode.R_TYPE) & (self.input.funct == Funct.JR)
+        is_branch = self.input.opcode.matches(OPCODE_BRANCH) | is_jr
+        branch_hazard = is_branch & (
+            (match_id_ex & haz_src.id_ex_reg_write_en)
+            | (match_ex_mem & haz_src.ex_mem_reg_write_en & haz_src.ex_mem_mem_read_en)
         )
 
-        branch_hazard_mem = (
-            is_branch
-            & (self.input.if_id_src_reg != 0)
-            & haz_src.ex_mem_reg_write_en
-            & (haz_src.ex_mem_dest_reg == self.input.if_id_src_reg)
-        )
-
-        m.d.comb += self.output.stall.eq(
-            load_use_hazard | branch_hazard_ex | branch_hazard_mem
-        )
+        m.d.comb += self.output.stall.eq(load_use_hazard | branch_hazard)
 
         return m
 
@@ -584,15 +750,21 @@ class InstructionDecodeStage(wiring.Component):
     rs_value_in: In(32)
     rt_value_in: In(32)
 
-    current_pc: In(32)
-
     # 输出接口
     output: Out(IDStageBus())
     pc_en_out: Out(1)
     forward_en_out: Out(1)
 
+    # 解析出的下一条PC与预测不符时请求冲刷；next_pc只在本周期送往PC，不进入ID/EX
+    next_pc: Out(32)
     flush_request: Out(1)
 
+    # 分支解析结果，用于更新BTB和两级预测器
+    branch_resolved: Out(1)
+    branch_conditional: Out(1)  # BEQ/BNE（J/JAL不参与方向预测）
+    branch_taken: Out(1)
+    branch_target: Out(32)
+
     def __init__(self):
         super().__init__()
 
@@ -601,155 +773,131 @@ class InstructionDecodeStage(wiring.Component):
 
         # 提取所有指令都有的字段
         inst_word = self.input.inst_word
-        pc_snapshot = self.input.next_pc
 
-        opcode = inst_word[26:32]
-        rs = inst_word[21:26]
-        rt = inst_word[16:21]
+        # 指令字段只切片一次，之后各处复用同名信号
+        opcode = Signal(6)
+        rs = Signal(5)
+        rt = Signal(5)
+        rd = Signal(5)
+        shamt = Signal(5)
+        funct = Signal(6)
+        imm = Signal(16)
+        jaddr = Signal(26)
+        m.d.comb += [
+            opcode.eq(inst_word[26:32]),
+            rs.eq(inst_word[21:26]),
+            rt.eq(inst_word[16:21]),
+            rd.eq(inst_word[11:16]),
+            shamt.eq(inst_word[6:11]),
+            funct.eq(inst_word[0:6]),
+            imm.eq(inst_word[0:16]),
+            jaddr.eq(inst_word[0:26]),
+        ]
+
+        # R型与分支/跳转指令的opcode高3位都为0：高位只比较一次，
+        # 组内再按低3位分派，比较器宽度从6位减为3位
+        op_hi = Signal(3)
+        op_lo = Signal(3)
+        m.d.comb += [op_hi.eq(opcode[3:6]), op_lo.eq(opcode[0:3])]
+        is_control_group = Signal()
+        m.d.comb += is_control_group.eq(op_hi == 0)
+        is_rtype = is_control_group & (op_lo == (Opcode.R_TYPE & 0b111))
 
         # 默认输出所有指令都有的字段
         m.d.comb += self.output.rs_index.eq(rs)
         m.d.comb += self.output.rt_index.eq(rt)
         m.d.comb += self.output.rs_value.eq(self.rs_value_in)
         m.d.comb += self.output.rt_value.eq(self.rt_value_in)
-
-        # 默认控制信号
-        m.d.comb += self.output.mem_read_en.eq(0)
-        m.d.comb += self.output.mem_write_en.eq(0)
-        m.d.comb += self.output.reg_write_en.eq(0)
-        m.d.comb += self.output.mem_to_reg_sel.eq(0)
         m.d.comb += self.pc_en_out.eq(1)
 
-        # 处理PC输出：J型指令跳转，其他指令PC+4
-        with m.If((opcode == Opcode.J) | (opcode == Opcode.JAL)):
-            jump_addr = Cat(Const(0, 2), inst_word[0:26], pc_snapshot[28:32])
-            m.d.comb += self.output.next_pc.eq(jump_addr)
-            with m.If(self.input.next_pc != jump_addr):
-                m.d.comb += self.flush_request.eq(1)
-
-        with m.Else():
-            m.d.comb += self.output.next_pc.eq(self.input.next_pc)
-
-        # 按指令类型分组处理
-        with m.If(opcode == Opcode.R_TYPE):
-            # R型指令：使用寄存器作为ALU操作数
-            m.d.comb += self.output.alu_operand_sel.eq(0)
-
-            rd = inst_word[11:16]
-            shamt = inst_word[6:11]
-            funct = inst_word[0:6]
-
-            m.d.comb += self.output.shift_amount.eq(shamt)
-
-            # R型指令写回rd，数据来自ALU
-            m.d.comb += self.output.dest_reg.eq(rd)
-            m.d.comb += self.output.reg_write_en.eq(1)
-            m.d.comb += self.output.mem_to_reg_sel.eq(0)
-
-            with m.Switch(funct):
-                with m.Case(Funct.ADD):
-                    m.d.comb += self.output.alu_opcode.eq(0b0000)
-                with m.Case(Funct.SUB):
-                    m.d.comb += self.output.alu_opcode.eq(0b0001)
-                with m.Case(Funct.AND):
-                    m.d.comb += self.output.alu_opcode.eq(0b0010)
-                with m.Case(Funct.OR):
-                    m.d.comb += self.output.alu_opcode.eq(0b0011)
-                with m.Case(Funct.SLT):
-                    m.d.comb += self.output.alu_opcode.eq(0b0100)
-                with m.Case(Funct.SLL):
-                    m.d.comb += self.output.alu_opcode.eq(0b0101)
-                with m.Case(Funct.SRL):
-                    m.d.comb += self.output.alu_opcode.eq(0b0110)
-                with m.Case(Funct.JR):
-                    # jr指令：跳转到rs寄存器的值
-                    m.d.comb += self.output.next_pc.eq(self.rs_value_in)
-                    with m.If(self.input.next_pc != self.rs_value_in):
-                        m.d.comb += self.flush_request.eq(1)
-                    # jr不写寄存器
-                    m.d.comb += self.output.reg_write_en.eq(0)
-
-        with m.Elif(
-            (opcode == Opcode.ADDI)
-            | (opcode == Opcode.ANDI)
-            | (opcode == Opcode.ORI)
-            | (opcode == Opcode.SLTI)
-            | (opcode == Opcode.LW)
-            | (opcode == Opcode.SW)
-        ):
-            # I型算术/逻辑/访存指令：使用立即数作为ALU操作数
-            m.d.comb += self.output.alu_operand_sel.eq(1)
-
-            imm = inst_word[0:16]
-            m.d.comb += self.output.imm_value.eq(imm)
-
-            with m.Switch(opcode):
-                with m.Case(Opcode.ADDI):
-                    m.d.comb += self.output.alu_opcode.eq(0b0000)
-                    m.d.comb += self.output.dest_reg.eq(rt)
-                    m.d.comb += self.output.reg_write_en.eq(1)
-                with m.Case(Opcode.ANDI):
-                    m.d.comb += self.output.alu_opcode.eq(0b0010)
-                    m.d.comb += self.output.dest_reg.eq(rt)
-                    m.d.comb += self.output.reg_write_en.eq(1)
-                with m.Case(Opcode.ORI):
-                    m.d.comb += self.output.alu_opcode.eq(0b0011)
-                    m.d.comb += self.output.dest_reg.eq(rt)
-                    m.d.comb += self.output.reg_write_en.eq(1)
-                with m.Case(Opcode.SLTI):
-                    m.d.comb += self.output.alu_opcode.eq(0b0100)
-                    m.d.comb += self.output.dest_reg.eq(rt)
-                    m.d.comb += self.output.reg_write_en.eq(1)
-                with m.Case(Opcode.LW):
-                    m.d.comb += self.output.alu_opcode.eq(0b0000)
-                    m.d.comb += self.output.mem_read_en.eq(1)
-                    m.d.comb += self.output.dest_reg.eq(rt)
-                    m.d.comb += self.output.reg_write_en.eq(1)
-                    m.d.comb += self.output.mem_to_reg_sel.eq(1)
-                with m.Case(Opcode.SW):
-                    m.d.comb += self.output.alu_opcode.eq(0b0000)
-                    m.d.comb += self.output.mem_write_en.eq(1)
-                    # SW不写寄存器
-
-        with m.Elif((opcode == Opcode.BEQ) | (opcode == Opcode.BNE)):
-            # I型分支指令：比较两个寄存器
-            m.d.comb += self.output.alu_operand_sel.eq(0)
-
-            imm = inst_word[0:16]
-            imm_ext = Cat(imm, imm[15].replicate(16))
-
-            # 分支指令不写寄存器
-            with m.Switch(opcode):
-                with m.Case(Opcode.BEQ):
-                    with m.If(self.rs_value_in == self.rt_value_in):
-                        m.d.comb += self.output.next_pc.eq(
-                            self.current_pc + 4 + (imm_ext << 2)
-                        )
-                        with m.If(
-                            self.input.next_pc != (self.current_pc + 4 + (imm_ext << 2))
-                        ):
-                            m.d.comb += self.flush_request.eq(1)
-
-                with m.Case(Opcode.BNE):
-                    with m.If(self.rs_value_in != self.rt_value_in):
-                        m.d.comb += self.output.next_pc.eq(
-                            self.current_pc + 4 + (imm_ext << 2)
-                        )
-                        with m.If(
-                            self.input.next_pc != (self.current_pc + 4 + (imm_ext << 2))
-                        ):
-                            m.d.comb += self.flush_request.eq(1)
-
-        with m.Elif(opcode == Opcode.JAL):
-            # jal指令：写$31寄存器，数据来自pc+4
-            m.d.comb += self.output.dest_reg.eq(31)
-            m.d.comb += self.output.reg_write_en.eq(1)
-            m.d.comb += self.output.mem_to_reg_sel.eq(0)
-            m.d.comb += self.output.rs_index.eq(0)
-            m.d.comb += self.output.rt_index.eq(0)
-            m.d.comb += self.output.rs_value.eq(self.current_pc + 4)
-            m.d.comb += self.output.rt_value.eq(0)
-            m.d.comb += self.output.alu_operand_sel.eq(0)
+        # 控制信号：R型用funct、其余用opcode组成insn_code，查一次译码表即得全部控制字
+        # 译码表是异步读的只读存储器，FPGA上可映射为分布式RAM而不是多路选择器树
+        insn_code = Signal(7)
+        m.d.comb += insn_code.eq(Mux(is_rtype, Cat(funct, 1), Cat(opcode, 0)))
+        m.submodules.decode_rom = decode_rom = Memory(
+            shape=CONTROL_WIDTH, depth=len(DECODE_TABLE), init=DECODE_TABLE
+        )
+        rom_port = decode_rom.read_port(domain="comb")
+        m.d.comb += rom_port.addr.eq(insn_code)
+        ctrl = rom_port.data
+
+        dest_sel = Signal(2)
+        m.d.comb += Cat(
+            self.output.alu_operand_sel,
+            self.output.mem_read_en,
+            self.output.mem_write_en,
+            self.output.reg_write_en,
+            self.output.mem_to_reg_sel,
+            self.output.alu_opcode,
+            dest_sel,
+        ).eq(ctrl)
+
+        dest_options = Array([Const(0, 5), rd, rt, Const(31, 5)])
+        m.d.comb += self.output.dest_reg.eq(dest_options[dest_sel])
+
+        # 只有R型使用shamt，只有选择立即数的I型指令使用imm
+        m.d.comb += self.output.shift_amount.eq(Mux(is_rtype, shamt, 0))
+        # 立即数在ID阶段一次扩展好：逻辑立即数（ANDI/ORI）零扩展，其余符号扩展
+        imm_ext = Signal(32)
+        m.d.comb += imm_ext.eq(imm.as_signed())
+        is_logic_imm = self.output.alu_opcode[ALUOp.AND] | self.output.alu_opcode[ALUOp.OR]
+        with m.If(self.output.alu_operand_sel):
+            m.d.comb += self.output.imm_value.eq(Mux(is_logic_imm, imm, imm_ext))
+
+        # J型跳转地址（区域取PC+4的高4位）与分支目标始终计算
+        jump_addr = Signal(32)
+        m.d.comb += jump_addr.eq(Cat(Const(0, 2), jaddr, self.input.pc_plus4[28:32]))
+
+        # 默认沿用取指阶段预测的PC；跳转/分支指令在下面覆盖next_pc并置位is_redirect
+        is_redirect = Signal()
+        m.d.comb += self.next_pc.eq(self.input.next_pc)
+        branch_target = Signal(32)
+        m.d.comb += branch_target.eq(self.input.pc_plus4 + (imm_ext << 2))
+
+        with m.If(is_control_group):
+            with m.Switch(op_lo):
+                with m.Case(Opcode.R_TYPE & 0b111):
+                    with m.If(funct == Funct.JR):
+                        # jr指令：跳转到rs寄存器的值
+                        m.d.comb += [
+                            is_redirect.eq(1),
+                            self.next_pc.eq(self.rs_value_in),
+                        ]
+
+                # I型分支指令：BEQ/BNE共用一个比较器，opcode最低位决定取反
+                # 分支指令不写寄存器；取指阶段可能已按BTB预测跳转，
+                # 因此无论是否跳转都要核对预测的PC
+                with m.Case(OPCODE_BRANCH[3:]):
+                    taken = (self.rs_value_in == self.rt_value_in) ^ op_lo[0]
+                    m.d.comb += [
+                        is_redirect.eq(1),
+                        self.branch_resolved.eq(1),
+                        self.branch_conditional.eq(1),
+                        self.branch_taken.eq(taken),
+                        self.branch_target.eq(branch_target),
+                        self.next_pc.eq(Mux(taken, branch_target, self.input.pc_plus4)),
+                    ]
+
+                # J/JAL总是跳转，同样写入BTB，之后取指即可直接预测
+                with m.Case(OPCODE_JUMP[3:]):
+                    m.d.comb += [
+                        is_redirect.eq(1),
+                        self.branch_resolved.eq(1),
+                        self.branch_taken.eq(1),
+                        self.branch_target.eq(jump_addr),
+                        self.next_pc.eq(jump_addr),
+                    ]
+                    with m.If(op_lo[0]):
+                        # jal指令：写$31寄存器，数据来自pc+4
+                        m.d.comb += self.output.rs_index.eq(0)
+                        m.d.comb += self.output.rt_index.eq(0)
+                        m.d.comb += self.output.rs_value.eq(self.input.pc_plus4)
+                        m.d.comb += self.output.rt_value.eq(0)
+
+        # 所有重定向共用一个32位比较器：解析出的PC与预测不符时请求冲刷
+        m.d.comb += self.flush_request.eq(
+            is_redirect & (self.next_pc != self.input.next_pc)
+        )
 
         return m
 
@@ -767,37 +915,33 @@ class IDEXRegister(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        # 始终传递数据信号
-        m.d.sync += [
-            self.output.rs_index.eq(self.input.rs_index),
-            self.output.rt_index.eq(self.input.rt_index),
-            self.output.rs_value.eq(self.input.rs_value),
-            self.output.rt_value.eq(self.input.rt_value),
-            self.output.imm_value.eq(self.input.imm_value),
-            self.output.shift_amount.eq(self.input.shift_amount),
-            self.output.alu_opcode.eq(self.input.alu_opcode),
-            self.output.alu_operand_sel.eq(self.input.alu_operand_sel),
-            self.output.dest_reg.eq(self.input.dest_reg),
-            self.output.mem_to_reg_sel.eq(self.input.mem_to_reg_sel),
-            self.output.next_pc.eq(self.input.next_pc),
+        # 数据信号始终传递；控制信号在stall时清零以插入气泡
+        bubble_fields = {("mem_read_en",), ("mem_write_en",), ("reg_write_en",)}
+        sources = [
+            field & ~self.stall if path in bubble_fields else field
+            for path, _flow, field in self.input.signature.flatten(self.input)
         ]
-
-        # 控制信号：stall时插入气泡
-        with m.If(self.stall):
-            m.d.sync += [
-                self.output.mem_read_en.eq(0),
-                self.output.mem_write_en.eq(0),
-                self.output.reg_write_en.eq(0),
-            ]
-        with m.Else():
-            m.d.sync += [
-                self.output.mem_read_en.eq(self.input.mem_read_en),
-                self.output.mem_write_en.eq(self.input.mem_write_en),
-                self.output.reg_write_en.eq(self.input.reg_write_en),
-            ]
+        _register_fields(m, sources, _interface_fields(self.output))
         return m
 
 
+def _forward(src_reg, fallback, fwd_src):
+    """Return the newest in-flight value of src_reg, or fallback if none."""
+    # $0寄存器永远不转发；EX/MEM（前一条指令）优先于MEM/WB（前前条指令）
+    nonzero = src_reg != 0
+    ex_hazard = (
+        nonzero & fwd_src.ex_mem_reg_write_en & (src_reg == fwd_src.ex_mem_dest_reg)
+    )
+    mem_hazard = (
+        nonzero & fwd_src.mem_wb_reg_write_en & (src_reg == fwd_src.mem_wb_dest_reg)
+    )
+    return Mux(
+        ex_hazard,
+        fwd_src.ex_mem_forward_value,
+        Mux(mem_hazard, fwd_src.mem_wb_forward_value, fallback),
+    )
+
+
 class ForwardingUnit(wiring.Component):
     """
     转发单元（Forwarding Unit）
@@ -805,7 +949,9 @@ class ForwardingUnit(wiring.Component):
     功能：检测数据冒险并选择正确的操作数来源
     - 如果前一条指令（在EX/MEM阶段）会写当前需要的寄存器，从EX/MEM转发
     - 如果前前条指令（在MEM/WB阶段）会写当前需要的寄存器，从MEM/WB转发
-    - 否则使用ID/EX流水线寄存器中的数据
+    - 否则使用fallback_data（寄存器文件读出的数据）
+
+    ExecuteStage内联了同样的选择逻辑（_forward），本单元用于ID阶段的分支比较。
 
     注意：$0寄存器永远不转发（因为$0恒为0）
     """
@@ -819,34 +965,14 @@ class ForwardingUnit(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        # 为了代码简洁，提取转发源信号
-        fwd_src = self.input.forwarding_source
-
-        # EX hazard: 前一条指令（在EX/MEM）写当前需要的寄存器
-        ex_hazard = (
-            (self.input.src_reg != 0)  # 不是$0
-            & fwd_src.ex_mem_reg_write_en  # 前一条指令要写寄存器
-            & (self.input.src_reg == fwd_src.ex_mem_dest_reg)  # 寄存器匹配
-        )
-
-        # MEM hazard: 前前条指令（在MEM/WB）写当前需要的寄存器
-        mem_hazard = (
-            (self.input.src_reg != 0)  # 不是$0
-            & fwd_src.mem_wb_reg_write_en  # 前前条指令要写寄存器
-            & (self.input.src_reg == fwd_src.mem_wb_dest_reg)  # 寄存器匹配
+        m.d.comb += self.output.forwarded_value.eq(
+            _forward(
+                self.input.src_reg,
+                self.input.fallback_data,
+                self.input.forwarding_source,
+            )
         )
 
-        # 选择数据源（EX hazard优先级高于MEM hazard）
-        with m.If(ex_hazard):
-            # 从EX/MEM转发
-            m.d.comb += self.output.forwarded_value.eq(fwd_src.ex_mem_forward_value)
-        with m.Elif(mem_hazard):
-            # 从MEM/WB转发
-            m.d.comb += self.output.forwarded_value.eq(fwd_src.mem_wb_forward_value)
-        with m.Else():
-            # 使用ID/EX的数据（无冒险）
-            m.d.comb += self.output.forwarded_value.eq(self.input.fallback_data)
-
         return m
 
 
@@ -856,9 +982,8 @@ class ExecuteStage(wiring.Component):
     input: In(IDStageBus())
     output: Out(EXStageBus())
 
-    # 转发数据输入（来自ForwardingUnit的输出）
-    forwarding_rs: In(ForwardingOutput())
-    forwarding_rt: In(ForwardingOutput())
+    # EX/MEM与MEM/WB的转发源，rs/rt两个操作数共用
+    forwarding_source: In(ForwardingSourceBus())
 
     def __init__(self):
         super().__init__()
@@ -869,26 +994,21 @@ class ExecuteStage(wiring.Component):
         # 实例化ALU作为子模块
         m.submodules.alu = alu = ALU()
 
-        # ALU 第二操作数选择（立即数或转发后的寄存器）
+        # 操作数转发：每个操作数一个3:1选择（EX/MEM、MEM/WB、ID/EX中的读数）
+        fwd_src = self.forwarding_source
+        rs_fwd = Signal(32)
+        rt_fwd = Signal(32)
+        m.d.comb += [
+            rs_fwd.eq(_forward(self.input.rs_index, self.input.rs_value, fwd_src)),
+            rt_fwd.eq(_forward(self.input.rt_index, self.input.rt_value, fwd_src)),
+        ]
+
+        # ALU 第二操作数选择：立即数已在ID阶段完成零/符号扩展，这里只剩一级2:1选择
         alu_b = Signal(signed(32))
-        with m.If(self.input.alu_operand_sel == 1):
-            # 逻辑立即数（ANDI/ORI）使用零扩展，其余指令符号扩展
-            is_logic_imm = (self.input.alu_opcode == 0b0010) | (
-                self.input.alu_opcode == 0b0011
-            )
-            with m.If(is_logic_imm):
-                m.d.comb += alu_b.eq(Cat(self.input.imm_value, Const(0, 16)))
-            with m.Else():
-                imm_ext = Cat(
-                    self.input.imm_value, self.input.imm_value[15].replicate(16)
-                )
-                m.d.comb += alu_b.eq(imm_ext)
-        with m.Else():
-            # 使用转发后的rt数据
-            m.d.comb += alu_b.eq(self.forwarding_rt.forwarded_value)
+        m.d.comb += alu_b.eq(Mux(self.input.alu_operand_sel, self.input.imm_value, rt_fwd))
 
         # 连接ALU输入（使用转发后的数据）
-        m.d.comb += alu.a.eq(self.forwarding_rs.forwarded_value)
+        m.d.comb += alu.a.eq(rs_fwd)
         m.d.comb += alu.b.eq(alu_b)
         m.d.comb += alu.shamt.eq(self.input.shift_amount)
         m.d.comb += alu.op.eq(self.input.alu_opcode)
@@ -897,7 +1017,7 @@ class ExecuteStage(wiring.Component):
         m.d.comb += self.output.alu_result_value.eq(alu.result)
 
         # 传递其他信号（mem_write_data也需要使用转发后的rt）
-        m.d.comb += self.output.store_data.eq(self.forwarding_rt.forwarded_value)
+        m.d.comb += self.output.store_data.eq(rt_fwd)
         m.d.comb += self.output.mem_read_en.eq(self.input.mem_read_en)
         m.d.comb += self.output.mem_write_en.eq(self.input.mem_write_en)
         m.d.comb += self.output.dest_reg.eq(self.input.dest_reg)
@@ -918,7 +1038,9 @@ class EXMEMRegister(wiring.Component):
 
     def elaborate(self, platform):
         m = Module()
-        _connect_interface(m, self.input, self.output, domain="sync")
+        _register_fields(
+            m, _interface_fields(self.input), _interface_fields(self.output)
+        )
         return m
 
 
@@ -949,20 +1071,12 @@ class MemoryStage(wiring.Component):
         m.d.comb += self.output.reg_write_en.eq(self.input.reg_write_en)
         m.d.comb += self.output.mem_to_reg_sel.eq(self.input.mem_to_reg_sel)
 
-        # 内存操作控制
-        with m.If(self.input.mem_write_en == 1):
-            m.d.comb += self.mem_write_data_out.eq(self.input.store_data)
-            m.d.comb += self.mem_write_en_out.eq(1)
-            m.d.comb += self.output.load_data.eq(0)  # 写操作时不需要读数据
-        with m.Elif(self.input.mem_read_en == 1):
-            m.d.comb += self.mem_write_en_out.eq(0)
-            m.d.comb += self.output.load_data.eq(self.mem_read_data_in)
-            m.d.comb += self.mem_write_data_out.eq(0)  # 读操作时不需要写数据
-        with m.Else():
-            # 既不读也不写
-            m.d.comb += self.mem_write_en_out.eq(0)
-            m.d.comb += self.output.load_data.eq(0)
-            m.d.comb += self.mem_write_data_out.eq(0)
+        # 内存操作控制：译码保证读写不会同时有效，各输出直接由对应控制位选择
+        m.d.comb += [
+            self.mem_write_en_out.eq(self.input.mem_write_en),
+            self.mem_write_data_out.eq(Mux(self.input.mem_write_en, self.input.store_data, 0)),
+            self.output.load_data.eq(Mux(self.input.mem_read_en, self.mem_read_data_in, 0)),
+        ]
 
         return m
 
@@ -978,7 +1092,9 @@ class MEMWBRegister(wiring.Component):
 
     def elaborate(self, platform):
         m = Module()
-        _connect_interface(m, self.input, self.output, domain="sync")
+        _register_fields(
+            m, _interface_fields(self.input), _interface_fields(self.output)
+        )
         return m
 
 
@@ -994,10 +1110,9 @@ class WriteBackStage(wiring.Component):
     def elaborate(self, platform):
         m = Module()
 
-        with m.If(self.input.mem_to_reg_sel == 1):
-            m.d.comb += self.output.write_back_data.eq(self.input.load_data)
-        with m.Else():
-            m.d.comb += self.output.write_back_data.eq(self.input.alu_result_value)
+        m.d.comb += self.output.write_back_data.eq(
+            Mux(self.input.mem_to_reg_sel, self.input.load_data, self.input.alu_result_value)
+        )
 
         m.d.comb += self.output.dest_reg.eq(self.input.dest_reg)
         m.d.comb += self.output.reg_write_en.eq(self.input.reg_write_en)
@@ -1025,17 +1140,21 @@ class CPU(wiring.Component):
 
     def elaborate(self, platform):
         m = Module()
+        # 组合赋值全部收集在列表中，最后一次性加入comb域
+        comb = []
 
         # ========== 实例化所有子模块 ==========
         m.submodules.pc = pc = PC()
         m.submodules.pc_controller = pc_controller = PCController()
         self.regfile = regfile = RegFile()
         m.submodules.regfile = regfile
-        m.submodules.forwarding_unit_rs = forwarding_unit_rs = ForwardingUnit()
-        m.submodules.forwarding_unit_rt = forwarding_unit_rt = ForwardingUnit()
+        m.submodules.forwarding_unit_id_rs = forwarding_unit_id_rs = ForwardingUnit()
+        m.submodules.forwarding_unit_id_rt = forwarding_unit_id_rt = ForwardingUnit()
         m.submodules.hazard_detection_rs = hazard_detection_rs = HazardDetectionUnit()
         m.submodules.hazard_detection_rt = hazard_detection_rt = HazardDetectionUnit()
 
+        m.submodules.btb = btb = BranchTargetBuffer()
+        m.submodules.predictor = predictor = TwoLevelPredictor()
         m.submodules.fetch_stage = fetch_stage = InstructionFetchStage()
         m.submodules.if_id_reg = if_id_reg = IFIDRegister()
         m.submodules.decode_stage = decode_stage = InstructionDecodeStage()
@@ -1056,153 +1175,184 @@ class CPU(wiring.Component):
         connect(m, memory_stage.output, mem_wb_reg.input)
         connect(m, mem_wb_reg.output, writeback_stage.input)
 
+        # 各阶段输出在下面多次引用，先绑定到局部变量
+        fetch_out = fetch_stage.output
+        if_id_out = if_id_reg.output
+        dec_out = decode_stage.output
+        id_ex_out = id_ex_reg.output
+        ex_mem_out = ex_mem_reg.output
+        mem_wb_out = mem_wb_reg.output
+        wb_out = writeback_stage.output
+
         # ========== 寄存器文件连接 ==========
-        # 读端口（ID阶段）
-        m.d.comb += [
-            regfile.rd_addr0.eq(decode_stage.output.rs_index),
-            regfile.rd_addr1.eq(decode_stage.output.rt_index),
-            decode_stage.rs_value_in.eq(regfile.rd_data0),
-            decode_stage.rt_value_in.eq(regfile.rd_data1),
-            decode_stage.current_pc.eq(if_id_reg.output.current_pc),
-        ]
+        # 读端口（ID阶段），读出值经ID阶段的ForwardingUnit后送入译码
+        comb.extend([
+            regfile.rd_addr0.eq(dec_out.rs_index),
+            regfile.rd_addr1.eq(dec_out.rt_index),
+        ])
 
         # 写端口（WB阶段）
-        m.d.comb += [
-            regfile.wr_addr.eq(writeback_stage.output.dest_reg),
-            regfile.wr_data.eq(writeback_stage.output.write_back_data),
-            regfile.wr_en.eq(writeback_stage.output.reg_write_en),
-        ]
+        comb.extend([
+            regfile.wr_addr.eq(wb_out.dest_reg),
+            regfile.wr_data.eq(wb_out.write_back_data),
+            regfile.wr_en.eq(wb_out.reg_write_en),
+        ])
 
         # ========== 指令内存连接 ==========
-        m.d.comb += [
+        # 指令存储器为同步读：本周期发出地址，下一周期数据直接进入ID阶段
+        comb.extend([
             self.imem_addr.eq(fetch_stage.imem_addr),
-            fetch_stage.imem_data_in.eq(self.imem_rdata),
-        ]
+            if_id_reg.imem_data_in.eq(self.imem_rdata),
+            if_id_reg.squash.eq(fetch_stage.squash),
+        ])
 
         # ========== 数据内存连接 ==========
         # 读地址直接来自EX阶段（组合逻辑），在EX周期发出，MEM周期得到数据
         # 写地址来自MEM阶段（经过EX/MEM寄存器），与写数据同步
-        m.d.comb += [
+        comb.extend([
             self.dmem_read_addr.eq(execute_stage.output.alu_result_value),
             self.dmem_write_addr.eq(memory_stage.mem_addr_out),
             self.dmem_wdata.eq(memory_stage.mem_write_data_out),
             self.dmem_wen.eq(memory_stage.mem_write_en_out),
             memory_stage.mem_read_data_in.eq(self.dmem_rdata),
-        ]
+        ])
+
+        # ========== 转发源连接 ==========
+
+        # 转发源只驱动一次，再用connect扇出到ExecuteStage和ID阶段的ForwardingUnit
+        fwd_src = ForwardingSourceBus().create(path=("fwd_src",))
+        comb.extend([
+            # EX/MEM阶段转发源
+            fwd_src.ex_mem_reg_write_en.eq(ex_mem_out.reg_write_en),
+            fwd_src.ex_mem_dest_reg.eq(ex_mem_out.dest_reg),
+            fwd_src.ex_mem_forward_value.eq(ex_mem_out.alu_result_value),
+            # MEM/WB阶段转发源
+            fwd_src.mem_wb_reg_write_en.eq(mem_wb_out.reg_write_en),
+            fwd_src.mem_wb_dest_reg.eq(mem_wb_out.dest_reg),
+            fwd_src.mem_wb_forward_value.eq(wb_out.write_back_data),
+        ])
+        connect(
+            m,
+            fwd_src,
+            execute_stage.forwarding_source,
+            forwarding_unit_id_rs.input.forwarding_source,
+            forwarding_unit_id_rt.input.forwarding_source,
+        )
 
-        # ========== ForwardingUnit连接（优雅版 - 使用嵌套接口避免重复） ==========
-
-        # 连接共享的转发源到两个ForwardingUnit（只需连接一次！）
-        for fu in [forwarding_unit_rs, forwarding_unit_rt]:
-            m.d.comb += [
-                # EX/MEM阶段转发源
-                fu.input.forwarding_source.ex_mem_reg_write_en.eq(
-                    ex_mem_reg.output.reg_write_en
-                ),
-                fu.input.forwarding_source.ex_mem_dest_reg.eq(
-                    ex_mem_reg.output.dest_reg
-                ),
-                fu.input.forwarding_source.ex_mem_forward_value.eq(
-                    ex_mem_reg.output.alu_result_value
-                ),
-                # MEM/WB阶段转发源
-                fu.input.forwarding_source.mem_wb_reg_write_en.eq(
-                    mem_wb_reg.output.reg_write_en
-                ),
-                fu.input.forwarding_source.mem_wb_dest_reg.eq(
-                    mem_wb_reg.output.dest_reg
-                ),
-                fu.input.forwarding_source.mem_wb_forward_value.eq(
-                    writeback_stage.output.write_back_data
-                ),
-            ]
-
-        # 连接各自的源寄存器和备用数据
-        m.d.comb += [
-            # rs操作数
-            forwarding_unit_rs.input.src_reg.eq(id_ex_reg.output.rs_index),
-            forwarding_unit_rs.input.fallback_data.eq(id_ex_reg.output.rs_value),
-            # rt操作数
-            forwarding_unit_rt.input.src_reg.eq(id_ex_reg.output.rt_index),
-            forwarding_unit_rt.input.fallback_data.eq(id_ex_reg.output.rt_value),
-        ]
+        # ID阶段转发：分支比较和JR直接使用EX/MEM中的ALU结果，不必等到写回。
+        # MEM/WB的数据寄存器文件本身已写优先旁路，这里转发结果相同。
+        # EX/MEM为load时转发值是地址而非数据，冒险检测对分支和JR都会暂停，结果不被使用
+        comb.extend([
+            forwarding_unit_id_rs.input.src_reg.eq(dec_out.rs_index),
+            forwarding_unit_id_rs.input.fallback_data.eq(regfile.rd_data0),
+            forwarding_unit_id_rt.input.src_reg.eq(dec_out.rt_index),
+            forwarding_unit_id_rt.input.fallback_data.eq(regfile.rd_data1),
+            decode_stage.rs_value_in.eq(forwarding_unit_id_rs.output.forwarded_value),
+            decode_stage.rt_value_in.eq(forwarding_unit_id_rt.output.forwarded_value),
+        ])
+
+        # ========== HazardDetectionUnit连接 ==========
+
+        # 冒险源同样只驱动一次，再扇出到两个HazardDetectionUnit
+        haz_src = HazardDetectionSourceBus().create(path=("haz_src",))
+        comb.extend([
+            # ID/EX阶段的load信息
+            haz_src.id_ex_mem_read_en.eq(id_ex_out.mem_read_en),
+            haz_src.id_ex_dest_reg.eq(id_ex_out.dest_reg),
+            haz_src.id_ex_reg_write_en.eq(id_ex_out.reg_write_en),
+            # EX/MEM阶段
+            haz_src.ex_mem_reg_write_en.eq(ex_mem_out.reg_write_en),
+            haz_src.ex_mem_mem_read_en.eq(ex_mem_out.mem_read_en),
+            haz_src.ex_mem_dest_reg.eq(ex_mem_out.dest_reg),
+        ])
+        connect(
+            m,
+            haz_src,
+            hazard_detection_rs.input.hazard_source,
+            hazard_detection_rt.input.hazard_source,
+        )
 
-        # ForwardingUnit输出 → ExecuteStage
-        connect(m, forwarding_unit_rs.output, execute_stage.forwarding_rs)
-        connect(m, forwarding_unit_rt.output, execute_stage.forwarding_rt)
-
-        # ========== HazardDetectionUnit连接（优雅版 - 使用嵌套接口避免重复） ==========
-
-        # 连接共享的hazard源到两个HazardDetectionUnit（只需连接一次！）
-        for hd in [hazard_detection_rs, hazard_detection_rt]:
-            m.d.comb += [
-                # ID/EX阶段的load信息
-                hd.input.hazard_source.id_ex_mem_read_en.eq(
-                    id_ex_reg.output.mem_read_en
-                ),
-                hd.input.hazard_source.id_ex_dest_reg.eq(id_ex_reg.output.dest_reg),
-                hd.input.hazard_source.id_ex_reg_write_en.eq(
-                    id_ex_reg.output.reg_write_en
-                ),
-                hd.input.hazard_source.ex_mem_reg_write_en.eq(
-                    ex_mem_reg.output.reg_write_en
-                ),
-                hd.input.hazard_source.ex_mem_dest_reg.eq(ex_mem_reg.output.dest_reg),
-            ]
-
-        # 连接各自的源寄存器（IF/ID阶段）
-        m.d.comb += [
+        # 连接各自的源寄存器（IF/ID阶段），opcode/funct两个单元共用
+        if_id_opcode = Signal(6)
+        if_id_funct = Signal(6)
+        if_id_rs = Signal(5)
+        if_id_rt = Signal(5)
+        comb.extend([
+            if_id_opcode.eq(if_id_out.inst_word[26:32]),
+            if_id_rs.eq(if_id_out.inst_word[21:26]),
+            if_id_rt.eq(if_id_out.inst_word[16:21]),
+            if_id_funct.eq(if_id_out.inst_word[0:6]),
             # rs操作数
-            hazard_detection_rs.input.if_id_src_reg.eq(
-                if_id_reg.output.inst_word[21:26]
-            ),
-            hazard_detection_rs.input.opcode.eq(if_id_reg.output.inst_word[26:32]),
+            hazard_detection_rs.input.if_id_src_reg.eq(if_id_rs),
+            hazard_detection_rs.input.opcode.eq(if_id_opcode),
+            hazard_detection_rs.input.funct.eq(if_id_funct),
             # rt操作数
-            hazard_detection_rt.input.if_id_src_reg.eq(
-                if_id_reg.output.inst_word[16:21]
-            ),
-            hazard_detection_rt.input.opcode.eq(if_id_reg.output.inst_word[26:32]),
-        ]
+            hazard_detection_rt.input.if_id_src_reg.eq(if_id_rt),
+            hazard_detection_rt.input.opcode.eq(if_id_opcode),
+            hazard_detection_rt.input.funct.eq(if_id_funct),
+        ])
 
-        # 合并stall信号：任何一个检测到冒险就暂停流水线
-        pipeline_stall = Signal()
-        m.d.comb += pipeline_stall.eq(
-            hazard_detection_rs.output.stall | hazard_detection_rt.output.stall
-        )
+        # 合并stall信号：任何一个检测到冒险就暂停流水线（表达式直接送往各使用者）
+        pipeline_stall = hazard_detection_rs.output.stall | hazard_detection_rt.output.stall
 
         # 连接stall信号到IF/ID寄存器、ID/EX寄存器和fetch_stage
-        m.d.comb += if_id_reg.stall.eq(pipeline_stall)
-        m.d.comb += id_ex_reg.stall.eq(pipeline_stall)
-        m.d.comb += fetch_stage.stall.eq(pipeline_stall)
+        comb.extend([
+            if_id_reg.stall.eq(pipeline_stall),
+            id_ex_reg.stall.eq(pipeline_stall),
+            fetch_stage.stall.eq(pipeline_stall),
+        ])
 
         # 连接reset信号
-        m.d.comb += fetch_stage.reset.eq(self.reset)
+        comb.append(fetch_stage.reset.eq(self.reset))
+
+        # ========== 分支预测（BTB + 两级预测器）连接 ==========
+        # IF阶段按PC+4查表；ID阶段解析分支后更新，stall期间同一分支会被重复解析，不更新
+        branch_update = Signal()
+        comb.append(branch_update.eq(decode_stage.branch_resolved & ~pipeline_stall))
+        comb.extend([
+            btb.lookup_addr.eq(fetch_stage.btb_lookup_addr),
+            predictor.lookup_addr.eq(fetch_stage.btb_lookup_addr),
+            fetch_stage.btb_hit.eq(btb.hit),
+            fetch_stage.btb_predicted.eq(btb.target_addr),
+            fetch_stage.btb_predicted_taken.eq(btb.unconditional | predictor.predicted),
+            fetch_stage.branch_history.eq(predictor.history),
+            btb.update_addr.eq(if_id_out.pc_plus4),
+            btb.update_target.eq(decode_stage.branch_target),
+            btb.update_unconditional.eq(~decode_stage.branch_conditional),
+            btb.update_taken.eq(decode_stage.branch_taken),
+            btb.update_enable.eq(branch_update),
+            predictor.update_addr.eq(if_id_out.pc_plus4),
+            predictor.update_history.eq(if_id_out.history),
+            predictor.update_taken.eq(decode_stage.branch_taken),
+            predictor.update_enable.eq(branch_update & decode_stage.branch_conditional),
+        ])
 
         # 连接flush_request信号
-        m.d.comb += fetch_stage.flush_request.eq(decode_stage.flush_request)
+        comb.append(fetch_stage.flush_request.eq(decode_stage.flush_request))
 
         # ========== PC和PCController连接 ==========
         # PC输出连接到取指阶段
-        m.d.comb += fetch_stage.pc_current.eq(pc.addr_out)
+        comb.append(fetch_stage.pc_current.eq(pc.addr_out))
 
         # PCController输入连接
         # 当有分支/跳转时使用decode_stage的next_pc，否则使用fetch_stage的
-        next_pc_sel = Signal(32)
-        with m.If(decode_stage.flush_request):
-            m.d.comb += next_pc_sel.eq(decode_stage.output.next_pc)
-        with m.Else():
-            m.d.comb += next_pc_sel.eq(fetch_stage.output.next_pc)
-
-        m.d.comb += [
+        comb.extend([
             pc_controller.input.stall.eq(pipeline_stall),
-            pc_controller.input.id_next_pc.eq(next_pc_sel),
-        ]
+            pc_controller.input.id_next_pc.eq(
+                Mux(
+                    decode_stage.flush_request,
+                    decode_stage.next_pc,
+                    fetch_out.next_pc,
+                )
+            ),
+        ])
 
         # PCController输出连接到PC
-        m.d.comb += [
+        comb.extend([
             pc.enable.eq(pc_controller.output.enable),
             pc.addr_in.eq(pc_controller.output.addr_in),
             pc.reset.eq(self.reset),
-        ]
+        ])
 
+        m.d.comb += comb
         return m
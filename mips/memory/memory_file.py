@@ -11,24 +11,32 @@ class MemoryFile(wiring.Component):
     write_data: In(32)
     write_enable: In(1)
 
-    def __init__(self, depth=4096, sync_read=True):
+    def __init__(self, depth=4096, sync_read=True, init=None, transparent=True):
         self.depth = depth
         self.sync_read = sync_read
+        # 同步读时，同一地址同时读写是否直接返回新写入的数据
+        self.transparent = transparent
+        # 初始内容：在细化时直接写入存储器，仿真开始即可用，无需逐字写入
+        self.init = list(init) if init is not None else []
 
         super().__init__()
 
     def elaborate(self, platform):
         m = Module()
-        m.submodules.mem = mem = Memory(shape=unsigned(32), depth=self.depth, init=[])
+        m.submodules.mem = mem = Memory(
+            shape=unsigned(32), depth=self.depth, init=self.init
+        )
 
         # 写端口总是同步的
         wr_port = mem.write_port(domain="sync")
 
         # 读端口可以是同步或组合，取决于sync_read参数
-        # 同步读：读地址可以在EX阶段发出，MEM阶段得到数据，缩短关键路径
-        # 组合读：适用于指令内存，IF阶段立即得到指令
+        # 同步读：数据存储器在EX阶段发出读地址，MEM阶段得到数据；
+        #         指令存储器在IF阶段发出取指地址，读端口本身充当IF/ID的指令寄存器
+        # 组合读：同一周期得到数据
         if self.sync_read:
-            rd_port = mem.read_port(domain="sync", transparent_for=[wr_port])
+            transparent_for = [wr_port] if self.transparent else []
+            rd_port = mem.read_port(domain="sync", transparent_for=transparent_for)
         else:
             rd_port = mem.read_port(domain="comb")
 
@@ -49,6 +57,13 @@ class MemoryFile(wiring.Component):
 
 if __name__ == "__main__":
     from amaranth.sim import Simulator
+    from pathlib import Path
+    import contextlib
+    import sys
+
+    # 允许直接运行本文件（python mips/memory/memory_file.py）
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from mips.trace import trace_enabled
 
     dut = MemoryFile(depth=256)
 
@@ -158,5 +173,6 @@ if __name__ == "__main__":
     sim = Simulator(dut)
     sim.add_clock(1e-6)
     sim.add_testbench(bench)
-    with sim.write_vcd("memory.vcd"):
+    # 只在设置 TRACE=1 时写出波形
+    with sim.write_vcd("memory.vcd") if trace_enabled() else contextlib.nullcontext():
         sim.run()
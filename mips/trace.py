@@ -0,0 +1,11 @@
+"""Opt-in waveform tracing shared by the self-tests and the simulation benches."""
+
+import os
+
+# 设置该环境变量（如 TRACE=1）才会写出 VCD 波形
+TRACE_ENV_VAR = "TRACE"
+
+
+def trace_enabled() -> bool:
+    """Return True when waveform dumping has been requested via $TRACE."""
+    return os.environ.get(TRACE_ENV_VAR, "") not in ("", "0")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict, Tuple
 
 from mips.core.cpu import Opcode, Funct
@@ -37,9 +38,9 @@ def nop() -> int:
     return 0
 
 
-@dataclass
+@dataclass(frozen=True)
 class ProgramArtifact:
-    words: List[int]
+    words: Tuple[int, ...]
     done_pc: int
 
 
@@ -113,6 +114,7 @@ class ProgramBuilder:
         return self.labels[label]
 
 
+@lru_cache(maxsize=1)
 def build_hamming_program() -> ProgramArtifact:
     b = ProgramBuilder()
 
@@ -287,7 +289,7 @@ def build_hamming_program() -> ProgramArtifact:
 
     words = b.program()
     done_pc = b.address_of("end_loop") * WORD_BYTES
-    return ProgramArtifact(words=words, done_pc=done_pc)
+    return ProgramArtifact(words=tuple(words), done_pc=done_pc)
 
 
 __all__ = ["ProgramArtifact", "build_hamming_program"]
@@ -66,7 +66,9 @@ class AddiReproBench(wiring.Component):
     def elaborate(self, platform):
         m = Module()
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=256, sync_read=False)
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False
+        )
         m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
 
         m.d.comb += [
@@ -82,7 +84,7 @@ class AddiReproBench(wiring.Component):
             dmem.write_enable.eq(cpu.dmem_wen),
             cpu.dmem_rdata.eq(dmem.read_data),
             self.debug_pc.eq(cpu.imem_addr),
-            self.dmem_addr_mon.eq(cpu.dmem_addr),
+            self.dmem_addr_mon.eq(cpu.dmem_write_addr),
             self.dmem_wdata_mon.eq(cpu.dmem_wdata),
             self.dmem_wen_mon.eq(cpu.dmem_wen),
         ]
@@ -58,7 +58,9 @@ class CPUTestBench(wiring.Component):
 
         # 实例化组件
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=256, sync_read=False)
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False
+        )
         m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
 
         # 连接CPU和内存
@@ -0,0 +1,383 @@
+"""
+CPU分支操作数测试（Branch Operand Tests）
+
+分支在ID阶段比较操作数：生产者还在ID/EX时暂停一拍，到达EX/MEM后由ID阶段的
+ForwardingUnit直接转发ALU结果；EX/MEM中是load时数据尚未读出，必须继续暂停。
+每个场景单独运行一个程序，并按顺序断言全部数据存储：
+
+1. ALU生产者紧邻BEQ/BNE（先暂停，再从EX/MEM转发）
+2. ALU生产者相隔一条指令（直接从EX/MEM转发，不暂停）
+3. LW相隔一条/紧邻分支（load结果到MEM/WB后才能比较）
+4. JR的rs来自紧邻/相隔一条的ALU或LW（JR同样在ID阶段读取目标）
+5. 计数BNE循环（同时经过BTB与两级预测器的训练和退出时的误预测）
+
+走错路径的指令会向 ERROR_ADDR 存储，使断言失败。
+"""
+
+from pathlib import Path
+from typing import List, Tuple
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from amaranth import *
+from amaranth.lib import wiring
+from amaranth.lib.wiring import In, Out
+
+from mips.core.cpu import CPU, Opcode, Funct
+from mips.memory.memory_file import MemoryFile
+from program.harming import WORD_BYTES, ProgramBuilder
+from sim.test_utils import SimulationSpec, SimulationTest, run_tests_cli
+
+MASK32 = (1 << 32) - 1
+ERROR_ADDR = 0x7C
+LOAD_ADDR = 0x10
+MAX_CYCLES = 400
+# PC 停在 done 上这么多个周期后，之前的存储都已离开流水线
+HALT_CYCLES = 8
+
+Store = Tuple[int, int]
+
+
+class BranchOperandBench(wiring.Component):
+    """CPU + 预置程序的指令内存 + 数据内存，并引出数据存储监视端口。"""
+
+    reset: In(1)
+
+    debug_pc: Out(32)
+    dmem_addr_mon: Out(32)
+    dmem_wdata_mon: Out(32)
+    dmem_wen_mon: Out(1)
+
+    def __init__(self, program):
+        self.program = program
+        super().__init__()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.cpu = cpu = CPU()
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False, init=self.program
+        )
+        m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
+
+        m.d.comb += [
+            cpu.reset.eq(self.reset),
+            imem.read_addr.eq(cpu.imem_addr >> 2),
+            cpu.imem_rdata.eq(imem.read_data),
+            dmem.read_addr.eq(cpu.dmem_read_addr),
+            dmem.write_addr.eq(cpu.dmem_write_addr),
+            dmem.write_data.eq(cpu.dmem_wdata),
+            dmem.write_enable.eq(cpu.dmem_wen),
+            cpu.dmem_rdata.eq(dmem.read_data),
+            self.debug_pc.eq(cpu.imem_addr),
+            self.dmem_addr_mon.eq(cpu.dmem_write_addr),
+            self.dmem_wdata_mon.eq(cpu.dmem_wdata),
+            self.dmem_wen_mon.eq(cpu.dmem_wen),
+        ]
+        return m
+
+
+# ========== 测试程序 ==========
+def addi(b: ProgramBuilder, rt: int, rs: int, imm: int) -> None:
+    b.emit_i_type(Opcode.ADDI, rs, rt, imm)
+
+
+def add(b: ProgramBuilder, rd: int, rs: int, rt: int) -> None:
+    b.emit_r_type(Opcode.R_TYPE, rs, rt, rd, 0, Funct.ADD)
+
+
+def sw(b: ProgramBuilder, rt: int, addr: int) -> None:
+    b.emit_i_type(Opcode.SW, 0, rt, addr)
+
+
+def lw(b: ProgramBuilder, rt: int, addr: int) -> None:
+    b.emit_i_type(Opcode.LW, 0, rt, addr)
+
+
+def jr(b: ProgramBuilder, rs: int) -> None:
+    b.emit_r_type(Opcode.R_TYPE, rs, 0, 0, 0, Funct.JR)
+
+
+def nops(b: ProgramBuilder, count: int) -> None:
+    for _ in range(count):
+        b.emit_r_type(Opcode.R_TYPE, 0, 0, 0, 0, Funct.SLL)
+
+
+def wrong_path(b: ProgramBuilder) -> None:
+    """分支方向判断错误时才会执行的存储。"""
+    sw(b, 0, ERROR_ADDR)
+
+
+def finish(b: ProgramBuilder) -> Tuple[List[int], int]:
+    b.label("done")
+    b.emit_jump(Opcode.J, "done")
+    return b.program(), b.address_of("done") * WORD_BYTES
+
+
+def build_alu_adjacent() -> Tuple[List[int], int, List[Store]]:
+    b = ProgramBuilder()
+    addi(b, 2, 0, 5)
+    addi(b, 3, 0, 7)
+    nops(b, 3)
+
+    # rs生产者紧邻BEQ，跳转
+    addi(b, 1, 0, 5)
+    b.emit_branch(Opcode.BEQ, 1, 2, "t1")
+    wrong_path(b)
+    b.label("t1")
+    sw(b, 1, 0x40)
+
+    # rs生产者紧邻BNE，不跳转
+    addi(b, 4, 0, 7)
+    b.emit_branch(Opcode.BNE, 4, 3, "bad")
+    sw(b, 4, 0x44)
+
+    # rt生产者紧邻BNE，跳转
+    addi(b, 5, 0, 9)
+    b.emit_branch(Opcode.BNE, 3, 5, "t2")
+    wrong_path(b)
+    b.label("t2")
+    sw(b, 5, 0x48)
+
+    # rt生产者紧邻BEQ，不跳转
+    addi(b, 6, 0, 6)
+    b.emit_branch(Opcode.BEQ, 2, 6, "bad")
+    sw(b, 6, 0x4C)
+    b.emit_jump(Opcode.J, "done")
+
+    b.label("bad")
+    wrong_path(b)
+    program, done_pc = finish(b)
+    return program, done_pc, [(0x40, 5), (0x44, 7), (0x48, 9), (0x4C, 6)]
+
+
+def build_alu_one_earlier() -> Tuple[List[int], int, List[Store]]:
+    b = ProgramBuilder()
+    addi(b, 2, 0, 5)
+    addi(b, 3, 0, 7)
+    nops(b, 3)
+
+    # 中间隔一条无关指令，生产者在分支译码时已到EX/MEM
+    addi(b, 1, 0, 5)
+    addi(b, 7, 0, 1)
+    b.emit_branch(Opcode.BEQ, 1, 2, "t1")
+    wrong_path(b)
+    b.label("t1")
+    sw(b, 1, 0x40)
+
+    addi(b, 4, 0, 7)
+    addi(b, 7, 0, 2)
+    b.emit_branch(Opcode.BNE, 3, 4, "bad")
+    sw(b, 4, 0x44)
+
+    addi(b, 5, 0, 9)
+    addi(b, 7, 0, 3)
+    b.emit_branch(Opcode.BNE, 5, 3, "t2")
+    wrong_path(b)
+    b.label("t2")
+    sw(b, 5, 0x48)
+    sw(b, 7, 0x4C)
+    b.emit_jump(Opcode.J, "done")
+
+    b.label("bad")
+    wrong_path(b)
+    program, done_pc = finish(b)
+    return program, done_pc, [(0x40, 5), (0x44, 7), (0x48, 9), (0x4C, 3)]
+
+
+def build_load_before_branch() -> Tuple[List[int], int, List[Store]]:
+    b = ProgramBuilder()
+    addi(b, 2, 0, 5)
+    addi(b, 3, 0, 7)
+    nops(b, 3)
+    sw(b, 2, LOAD_ADDR)
+    nops(b, 3)
+
+    # LW隔一条指令后BEQ：load在EX/MEM时不能转发，必须暂停
+    lw(b, 1, LOAD_ADDR)
+    addi(b, 7, 0, 1)
+    b.emit_branch(Opcode.BEQ, 1, 2, "t1")
+    wrong_path(b)
+    b.label("t1")
+    sw(b, 1, 0x40)
+
+    # LW隔一条指令后BNE（rt操作数），不跳转
+    lw(b, 4, LOAD_ADDR)
+    addi(b, 7, 0, 2)
+    b.emit_branch(Opcode.BNE, 2, 4, "bad")
+    sw(b, 4, 0x44)
+
+    # LW紧邻BNE，跳转
+    lw(b, 5, LOAD_ADDR)
+    b.emit_branch(Opcode.BNE, 5, 3, "t2")
+    wrong_path(b)
+    b.label("t2")
+    sw(b, 5, 0x48)
+    b.emit_jump(Opcode.J, "done")
+
+    b.label("bad")
+    wrong_path(b)
+    program, done_pc = finish(b)
+    expected = [(LOAD_ADDR, 5), (0x40, 5), (0x44, 5), (0x48, 5)]
+    return program, done_pc, expected
+
+
+def build_jr_targets() -> Tuple[List[int], int, List[Store]]:
+    b = ProgramBuilder()
+    # 跳转目标放在程序开头，生成目标地址的立即数时标号已确定
+    b.emit_jump(Opcode.J, "main")
+    for index, reg in enumerate((5, 6, 7, 8), start=1):
+        b.label(f"t{index}")
+        sw(b, reg, 0x40 + 4 * (index - 1))
+        b.emit_jump(Opcode.J, f"r{index}")
+
+    b.label("main")
+    targets = [b.address_of(f"t{index}") * WORD_BYTES for index in range(1, 5)]
+    addi(b, 1, 0, targets[2])
+    addi(b, 2, 0, targets[3])
+    sw(b, 1, LOAD_ADDR)
+    sw(b, 2, LOAD_ADDR + 4)
+    nops(b, 3)
+
+    # ALU生产者紧邻JR：仍在EX中，必须暂停
+    addi(b, 5, 0, targets[0])
+    jr(b, 5)
+    wrong_path(b)
+    b.label("r1")
+
+    # ALU生产者相隔一条指令：从EX/MEM转发
+    addi(b, 6, 0, targets[1])
+    nops(b, 1)
+    jr(b, 6)
+    wrong_path(b)
+    b.label("r2")
+
+    # LW相隔一条指令：EX/MEM中只有load地址，必须等数据读出
+    lw(b, 7, LOAD_ADDR)
+    nops(b, 1)
+    jr(b, 7)
+    wrong_path(b)
+    b.label("r3")
+
+    # LW紧邻JR
+    lw(b, 8, LOAD_ADDR + 4)
+    jr(b, 8)
+    wrong_path(b)
+    b.label("r4")
+    program, done_pc = finish(b)
+
+    expected = [(LOAD_ADDR, targets[2]), (LOAD_ADDR + 4, targets[3])]
+    expected += [(0x40 + 4 * i, target) for i, target in enumerate(targets)]
+    return program, done_pc, expected
+
+
+def build_counted_loop() -> Tuple[List[int], int, List[Store]]:
+    iterations = 10
+    rounds = 2
+    b = ProgramBuilder()
+    addi(b, 9, 0, iterations)
+    addi(b, 13, 0, rounds)
+    addi(b, 11, 0, 0)
+    addi(b, 12, 0, 0)
+
+    # 外层循环让内层BNE在已训练的BTB/预测器上再跑一遍
+    b.label("outer")
+    addi(b, 8, 0, 0)
+    b.label("inner")
+    add(b, 11, 11, 8)
+    sw(b, 11, 0x80)
+    addi(b, 8, 8, 1)
+    b.emit_branch(Opcode.BNE, 8, 9, "inner")
+    addi(b, 12, 12, 1)
+    b.emit_branch(Opcode.BNE, 12, 13, "outer")
+    sw(b, 8, 0x84)
+    sw(b, 11, 0x88)
+    program, done_pc = finish(b)
+
+    expected: List[Store] = []
+    total = 0
+    for _ in range(rounds):
+        for i in range(iterations):
+            total += i
+            expected.append((0x80, total))
+    expected += [(0x84, iterations), (0x88, total)]
+    return program, done_pc, expected
+
+
+CASES = (
+    ("ALU生产者紧邻分支", build_alu_adjacent),
+    ("ALU生产者相隔一条指令", build_alu_one_earlier),
+    ("LW生产者在分支之前", build_load_before_branch),
+    ("JR目标来自ALU/LW生产者", build_jr_targets),
+    ("计数BNE循环", build_counted_loop),
+)
+
+
+def build_case_spec(index: int, title: str, build) -> SimulationSpec:
+    program, done_pc, expected = build()
+    dut = BranchOperandBench(program)
+
+    async def bench(ctx):
+        print(f"\n测试{index}: {title}")
+        ctx.set(dut.reset, 1)
+        await ctx.tick().repeat(2)
+        ctx.set(dut.reset, 0)
+
+        observed: List[Store] = []
+        halted = 0
+        for cycle in range(MAX_CYCLES):
+            await ctx.tick()
+            if ctx.get(dut.dmem_wen_mon):
+                addr = ctx.get(dut.dmem_addr_mon)
+                data = ctx.get(dut.dmem_wdata_mon) & MASK32
+                observed.append((addr, data))
+                print(f"  cycle {cycle:03d}: store addr=0x{addr:04X} data=0x{data:08X}")
+            halted = halted + 1 if ctx.get(dut.debug_pc) == done_pc else 0
+            if halted >= HALT_CYCLES:
+                break
+        else:
+            raise AssertionError(
+                f"测试{index}: {MAX_CYCLES} 个周期内未到达 done (PC=0x{done_pc:04X})"
+            )
+
+        if observed != expected:
+            raise AssertionError(
+                f"测试{index} 存储序列不符:\n"
+                f"  expected {[(hex(a), d) for a, d in expected]}\n"
+                f"  observed {[(hex(a), d) for a, d in observed]}"
+            )
+        print(f"✓ 测试{index}完成: {len(expected)} 次存储全部正确")
+
+    return SimulationSpec(
+        dut=dut, bench=bench, vcd_path=f"cpu_branch_operand_{index}.vcd"
+    )
+
+
+def build_branch_operand_specs() -> List[SimulationSpec]:
+    return [
+        build_case_spec(index, title, build)
+        for index, (title, build) in enumerate(CASES, start=1)
+    ]
+
+
+def get_tests() -> List[SimulationTest]:
+    return [
+        SimulationTest(
+            key="cpu-branch-operands",
+            name="CPU Branch Operand Forwarding",
+            description="断言ALU/LW生产者紧邻或相隔一条指令时分支比较与JR跳转的结果，以及计数BNE循环的每次存储。",
+            build=build_branch_operand_specs,
+            tags=("cpu", "branch", "forwarding", "hazard"),
+        )
+    ]
+
+
+def main() -> int:
+    return run_tests_cli(get_tests())
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
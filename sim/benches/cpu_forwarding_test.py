@@ -60,7 +60,9 @@ class CPUTestBench(wiring.Component):
         m = Module()
 
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=256, sync_read=False)
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False
+        )
         m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
 
         m.d.comb += [
@@ -154,8 +156,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(15):
-            await ctx.tick()
+        await ctx.tick().repeat(15)
 
         print("✓ 测试2完成: 期望$4=30 (40-10)")
 
@@ -182,8 +183,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(18):
-            await ctx.tick()
+        await ctx.tick().repeat(18)
 
         print("✓ 测试3完成: 期望$6=25 (15+10)")
 
@@ -211,8 +211,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(18):
-            await ctx.tick()
+        await ctx.tick().repeat(18)
 
         print("✓ 测试4完成: 期望$6=40 (20+20)")
 
@@ -237,8 +236,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(15):
-            await ctx.tick()
+        await ctx.tick().repeat(15)
 
         print("✓ 测试5完成: 期望$4=50 (0+50), $0应始终为0")
 
@@ -267,8 +265,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(20):
-            await ctx.tick()
+        await ctx.tick().repeat(20)
 
         print("✓ 测试6完成: 期望$8=26 (连续转发成功)")
 
@@ -290,8 +287,7 @@ def build_forwarding_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(12):
-            await ctx.tick()
+        await ctx.tick().repeat(12)
 
         print("✓ 测试7完成: 期望$3=0x0F")
 
@@ -253,7 +253,9 @@ class CPUFullSystemBench(wiring.Component):
     def elaborate(self, platform):
         m = Module()
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=512, sync_read=False)  # 指令内存：组合读
+        m.submodules.imem = imem = MemoryFile(
+            depth=512, sync_read=True, transparent=False
+        )  # 指令内存：同步读，读端口充当IF/ID指令寄存器
         m.submodules.dmem = dmem = MemoryFile(depth=512, sync_read=True)   # 数据内存：同步读
 
         m.d.comb += [
@@ -59,7 +59,9 @@ class CPUTestBench(wiring.Component):
         m = Module()
 
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=256, sync_read=False)
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False
+        )
         m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
 
         m.d.comb += [
@@ -163,8 +165,7 @@ def build_hazard_detection_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(15):
-            await ctx.tick()
+        await ctx.tick().repeat(15)
 
         print("✓ 测试2完成")
 
@@ -189,8 +190,7 @@ def build_hazard_detection_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(20):
-            await ctx.tick()
+        await ctx.tick().repeat(20)
 
         print("✓ 测试3完成")
 
@@ -250,8 +250,7 @@ def build_hazard_detection_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(12):
-            await ctx.tick()
+        await ctx.tick().repeat(12)
 
         print("✓ 测试5完成: $0寄存器不触发hazard")
 
@@ -276,8 +275,7 @@ def build_hazard_detection_spec() -> SimulationSpec:
         await load_program(ctx, dut, program)
 
         print("运行CPU...")
-        for i in range(18):
-            await ctx.tick()
+        await ctx.tick().repeat(18)
 
         print("✓ 测试6完成")
 
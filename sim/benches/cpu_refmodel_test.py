@@ -0,0 +1,127 @@
+"""
+CPU与参考模型比对测试（Reference Model Tests）
+
+把 build_hamming_program() 生成的汉明距离程序同时交给流水线RTL和
+sim/refmodel.py 的指令级参考模型执行，按顺序比较两者产生的全部存储器写。
+参考模型没有流水线，因此任何转发、暂停、分支预测或冲刷上的错误都会
+表现为写入序列的差异。
+"""
+
+from pathlib import Path
+from typing import List, Sequence, Tuple
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from amaranth import *
+from amaranth.lib import wiring
+from amaranth.lib.wiring import In, Out
+
+from mips.core.cpu import CPU
+from mips.memory.memory_file import MemoryFile
+from program.harming import build_hamming_program
+from sim import refmodel
+from sim.test_utils import SimulationSpec, SimulationTest, run_tests_cli
+
+MASK32 = (1 << 32) - 1
+MAX_CYCLES = 4000
+# PC 停在 done 上这么多个周期后，之前的存储都已离开流水线
+HALT_CYCLES = 12
+
+
+class RefModelBench(wiring.Component):
+    """CPU + 预置程序的指令内存；汉明程序不读数据内存，dmem_rdata 接 0。"""
+
+    reset: In(1)
+
+    debug_pc: Out(32)
+    dmem_addr_mon: Out(32)
+    dmem_wdata_mon: Out(32)
+    dmem_wen_mon: Out(1)
+
+    def __init__(self, program: Sequence[int]):
+        self.program = list(program)
+        super().__init__()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.cpu = cpu = CPU()
+        m.submodules.imem = imem = MemoryFile(
+            depth=max(256, len(self.program) + 8),
+            sync_read=True,
+            transparent=False,
+            init=self.program,
+        )
+
+        m.d.comb += [
+            cpu.reset.eq(self.reset),
+            imem.read_addr.eq(cpu.imem_addr >> 2),
+            cpu.imem_rdata.eq(imem.read_data),
+            cpu.dmem_rdata.eq(0),
+            self.debug_pc.eq(cpu.imem_addr),
+            self.dmem_addr_mon.eq(cpu.dmem_write_addr),
+            self.dmem_wdata_mon.eq(cpu.dmem_wdata),
+            self.dmem_wen_mon.eq(cpu.dmem_wen),
+        ]
+        return m
+
+
+def build_hamming_refmodel_spec() -> SimulationSpec:
+    artifact = build_hamming_program()
+    expected = refmodel.run(artifact.words, stop_pc=artifact.done_pc).writes
+    dut = RefModelBench(artifact.words)
+
+    async def bench(ctx):
+        print("\n汉明程序: RTL vs 参考模型")
+        ctx.set(dut.reset, 1)
+        await ctx.tick().repeat(3)
+        ctx.set(dut.reset, 0)
+
+        observed: List[Tuple[int, int]] = []
+        halted = 0
+        for cycle in range(MAX_CYCLES):
+            await ctx.tick()
+            if ctx.get(dut.dmem_wen_mon):
+                addr = ctx.get(dut.dmem_addr_mon) & MASK32
+                data = ctx.get(dut.dmem_wdata_mon) & MASK32
+                observed.append((addr, data))
+                print(f"  cycle {cycle:04d}: store addr=0x{addr:08X} data=0x{data:08X}")
+            halted = halted + 1 if ctx.get(dut.debug_pc) == artifact.done_pc else 0
+            if halted >= HALT_CYCLES:
+                break
+        else:
+            raise AssertionError(
+                f"{MAX_CYCLES} 个周期内未到达 done (PC=0x{artifact.done_pc:08X})"
+            )
+
+        if observed != expected:
+            raise AssertionError(
+                "RTL 与参考模型的存储序列不符:\n"
+                f"  refmodel {[(hex(a), hex(d)) for a, d in expected]}\n"
+                f"  rtl      {[(hex(a), hex(d)) for a, d in observed]}"
+            )
+        print(f"✓ {len(expected)} 次存储与参考模型一致")
+
+    return SimulationSpec(dut=dut, bench=bench, vcd_path="cpu_refmodel.vcd")
+
+
+def get_tests() -> List[SimulationTest]:
+    return [
+        SimulationTest(
+            key="cpu-refmodel",
+            name="CPU vs Reference Model",
+            description="汉明程序分别在RTL和指令级参考模型上运行，断言两者的存储器写序列相同。",
+            build=build_hamming_refmodel_spec,
+            tags=("cpu", "integration", "refmodel"),
+        )
+    ]
+
+
+def main() -> int:
+    return run_tests_cli(get_tests())
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,7 @@
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Tuple
 import sys
 
 # Allow running the script directly (python sim/benches/cpu_test.py)
@@ -8,12 +11,16 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from amaranth import *
 from amaranth.lib import wiring
-from amaranth.lib.wiring import In, Out
+from amaranth.lib.wiring import Out
 from mips.core.cpu import CPU, Opcode, Funct
 from mips.memory.memory_file import MemoryFile
 from sim.test_utils import SimulationSpec, SimulationTest, run_tests_cli
 
 
+# 冒烟程序把结果寄存器存到这里
+RESULT_ADDR = 0x40
+
+
 # ========== MIPS指令编码辅助函数 ==========
 def encode_r_type(opcode, rs, rt, rd, shamt, funct):
     """编码R型指令"""
@@ -32,6 +39,11 @@ def encode_j_type(opcode, addr):
     return (opcode << 26) | addr
 
 
+def store_result(reg, addr=None):
+    """SW $reg, addr($0)：把结果寄存器写入数据内存，供测试断言"""
+    return encode_i_type(Opcode.SW, 0, reg, RESULT_ADDR if addr is None else addr)
+
+
 def nop():
     """NOP指令 (SLL $0, $0, 0)"""
     return 0x00000000
@@ -41,16 +53,17 @@ def nop():
 class CPUTestBench(wiring.Component):
     """整合CPU、指令内存和数据内存的测试台"""
 
-    # 用于初始化指令内存的接口
-    imem_init_addr: In(32)
-    imem_init_data: In(32)
-    imem_init_we: In(1)
-
     # 用于调试的输出接口
     debug_pc: Out(32)
     debug_instr: Out(32)
-
-    def __init__(self):
+    # 数据存储监视端口，测试据此断言程序的结果
+    dmem_addr_mon: Out(32)
+    dmem_wdata_mon: Out(32)
+    dmem_wen_mon: Out(1)
+
+    def __init__(self, program=None):
+        # program 不为空时直接作为指令内存的初始内容，无需仿真时逐字加载
+        self.program = program
         super().__init__()
 
     def elaborate(self, platform):
@@ -58,16 +71,16 @@ class CPUTestBench(wiring.Component):
 
         # 实例化组件
         m.submodules.cpu = cpu = CPU()
-        m.submodules.imem = imem = MemoryFile(depth=256, sync_read=False)
+        m.submodules.imem = imem = MemoryFile(
+            depth=256, sync_read=True, transparent=False, init=self.program
+        )
         m.submodules.dmem = dmem = MemoryFile(depth=256, sync_read=True)
 
         # 连接CPU和内存
         m.d.comb += [
             # 指令内存连接
-            imem.read_addr.eq(Mux(self.imem_init_we, self.imem_init_addr, cpu.imem_addr)),
-            imem.write_addr.eq(self.imem_init_addr),
-            imem.write_data.eq(self.imem_init_data),
-            imem.write_enable.eq(self.imem_init_we),
+            # 程序已在细化时写入，指令内存只读；程序按字存放，字节地址右移两位
+            imem.read_addr.eq(cpu.imem_addr >> 2),
             cpu.imem_rdata.eq(imem.read_data),
             # 数据内存连接
             dmem.read_addr.eq(cpu.dmem_read_addr),
@@ -78,35 +91,37 @@ class CPUTestBench(wiring.Component):
             # 调试输出
             self.debug_pc.eq(cpu.imem_addr),
             self.debug_instr.eq(imem.read_data),
+            self.dmem_addr_mon.eq(cpu.dmem_write_addr),
+            self.dmem_wdata_mon.eq(cpu.dmem_wdata),
+            self.dmem_wen_mon.eq(cpu.dmem_wen),
         ]
 
         return m
 
 
-# ========== 辅助函数：加载程序 ==========
-async def load_program(ctx, dut, program):
-    """将程序加载到指令内存"""
-    for i, instr in enumerate(program):
-        ctx.set(dut.imem_init_addr, i)
-        ctx.set(dut.imem_init_data, instr)
-        ctx.set(dut.imem_init_we, 1)
-        await ctx.tick()
-    ctx.set(dut.imem_init_we, 0)
-    await ctx.tick()
+def build_test(program) -> CPUTestBench:
+    """把程序固化进指令内存，构建专用于该程序的测试台。"""
+    return CPUTestBench(program=program)
 
 
-def build_cpu_smoke_spec() -> SimulationSpec:
-    """组合CPU的功能测试。"""
-    dut = CPUTestBench()
+# ========== 冒烟测试用例 ==========
+@dataclass(frozen=True)
+class SmokeCase:
+    """单个冒烟测试：待执行的程序、运行周期数、期望的存储序列以及调试采样间隔。"""
+
+    title: str
+    program: Tuple[int, ...]
+    cycles: int
+    expected_stores: Tuple[Tuple[int, int], ...]  # 按顺序的 (地址, 数据)
+    done_message: str
+    run_message: str = "运行CPU..."
+    probe_every: int = 0  # 0 表示不采样调试输出
 
-    async def bench(ctx):
-        print("=" * 60)
-        print("CPU测试开始 - 无冒险场景")
-        print("=" * 60)
 
-        # ========== 测试1: R型指令 - ADD ==========
-        print("\n测试1: R型指令 - ADD")
-        program = [
+SMOKE_CASES: Tuple[SmokeCase, ...] = (
+    SmokeCase(
+        title="R型指令 - ADD",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 5),  # $1 = 5
             nop(),
             nop(),
@@ -119,24 +134,20 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
+            store_result(3),  # MEM[0x40] = $3
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  运行CPU...")
-        for i in range(20):
-            await ctx.tick()
-            if i % 5 == 0:
-                pc = ctx.get(dut.debug_pc)
-                instr = ctx.get(dut.debug_instr)
-                print(f"  Cycle {i}: PC={pc:08X}, Instr={instr:08X}")
-
-        print("✓ 测试1完成: ADD指令执行")
-
-        # ========== 测试2: I型指令 - ADDI ==========
-        print("\n测试2: I型指令 - ADDI")
-        program = [
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=20,
+        expected_stores=((RESULT_ADDR, 8),),
+        done_message="ADD指令执行",
+        probe_every=5,
+    ),
+    SmokeCase(
+        title="I型指令 - ADDI",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 100),  # $1 = 100
             nop(),
             nop(),
@@ -145,20 +156,19 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
+            store_result(2),  # MEM[0x40] = $2
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  运行CPU...")
-        for i in range(15):
-            await ctx.tick()
-
-        print("✓ 测试2完成: ADDI指令执行")
-
-        # ========== 测试3: 逻辑指令 - AND, OR ==========
-        print("\n测试3: 逻辑指令 - AND, OR")
-        program = [
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=15,
+        expected_stores=((RESULT_ADDR, 150),),
+        done_message="ADDI指令执行",
+    ),
+    SmokeCase(
+        title="逻辑指令 - AND, OR",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 0xFF),  # $1 = 0xFF
             nop(),
             nop(),
@@ -175,19 +185,20 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  运行CPU...")
-        for i in range(25):
-            await ctx.tick()
-
-        print("✓ 测试3完成: AND, OR指令执行")
-
-        # ========== 测试4: R型指令 - SUB ==========
-        print("\n测试4: R型指令 - SUB")
-        program = [
+            store_result(3),  # MEM[0x40] = $3
+            store_result(4, RESULT_ADDR + 4),  # MEM[0x44] = $4
+            nop(),
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=25,
+        expected_stores=((RESULT_ADDR, 0x0F), (RESULT_ADDR + 4, 0xFF)),
+        done_message="AND, OR指令执行",
+    ),
+    SmokeCase(
+        title="R型指令 - SUB",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 10),  # $1 = 10
             nop(),
             nop(),
@@ -200,20 +211,19 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
+            store_result(3),  # MEM[0x40] = $3
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  运行CPU...")
-        for i in range(20):
-            await ctx.tick()
-
-        print("✓ 测试4完成: SUB指令执行")
-
-        # ========== 测试5: 内存访问 - SW/LW ==========
-        print("\n测试5: 内存访问 - SW/LW")
-        program = [
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=20,
+        expected_stores=((RESULT_ADDR, 6),),
+        done_message="SUB指令执行",
+    ),
+    SmokeCase(
+        title="内存访问 - SW/LW",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 0x42),  # $1 = 0x42 (数据)
             nop(),
             nop(),
@@ -231,24 +241,21 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
+            store_result(3),  # MEM[0x40] = $3
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  执行SW/LW指令序列...")
-        for i in range(30):
-            await ctx.tick()
-            if i % 5 == 0:
-                pc = ctx.get(dut.debug_pc)
-                instr = ctx.get(dut.debug_instr)
-                print(f"  Cycle {i}: PC={pc:08X}, Instr={instr:08X}")
-
-        print("✓ 测试5完成: SW/LW指令执行")
-
-        # ========== 测试6: 移位指令 - SLL ==========
-        print("\n测试6: 移位指令 - SLL")
-        program = [
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=30,
+        expected_stores=((16, 0x42), (RESULT_ADDR, 0x42)),
+        done_message="SW/LW指令执行",
+        run_message="执行SW/LW指令序列...",
+        probe_every=5,
+    ),
+    SmokeCase(
+        title="移位指令 - SLL",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 0x01),  # $1 = 1
             nop(),
             nop(),
@@ -257,20 +264,19 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
+            store_result(2),  # MEM[0x40] = $2
             nop(),
-        ]
-
-        await load_program(ctx, dut, program)
-
-        print("  运行CPU...")
-        for i in range(15):
-            await ctx.tick()
-
-        print("✓ 测试6完成: SLL指令执行")
-
-        # ========== 测试7: 分支指令 - BEQ（无冒险） ==========
-        print("\n测试7: 分支指令 - BEQ（无冒险）")
-        program = [
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=15,
+        expected_stores=((RESULT_ADDR, 16),),
+        done_message="SLL指令执行",
+    ),
+    SmokeCase(
+        title="分支指令 - BEQ（无冒险）",
+        program=(
             encode_i_type(Opcode.ADDI, 0, 1, 1),  # $1 = 1
             nop(),
             nop(),
@@ -281,7 +287,7 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             encode_i_type(Opcode.BEQ, 1, 2, 5),  # 若相等，跳到目标块
             nop(),
-            encode_i_type(Opcode.ADDI, 0, 3, 9),  # 若未跳转，则写入9
+            encode_i_type(Opcode.ADDI, 0, 4, 9),  # 若未跳转，则向$4写入9
             nop(),
             nop(),
             nop(),
@@ -289,21 +295,66 @@ def build_cpu_smoke_spec() -> SimulationSpec:
             nop(),
             nop(),
             nop(),
-        ]
+            store_result(3),  # MEM[0x40] = $3
+            store_result(4, RESULT_ADDR + 4),  # MEM[0x44] = $4，跳转时应仍为0
+            nop(),
+            nop(),
+            nop(),
+            nop(),
+        ),
+        cycles=25,
+        expected_stores=((RESULT_ADDR, 5), (RESULT_ADDR + 4, 0)),
+        done_message="BEQ指令执行（无冒险）",
+    ),
+)
 
-        await load_program(ctx, dut, program)
 
-        print("  运行CPU...")
-        for i in range(25):
+@lru_cache(maxsize=None)
+def build_smoke_case_spec(index: int, case: SmokeCase) -> SimulationSpec:
+    """为单个测试程序构建独立的DUT，程序通过存储器初值预先装入。
+
+    结果按测试用例缓存：重复运行时复用同一个 spec 及其已构建的仿真器。
+    """
+    dut = build_test(case.program)
+
+    async def bench(ctx):
+        if index == 1:
+            print("=" * 60)
+            print("CPU测试开始 - 无冒险场景")
+            print("=" * 60)
+
+        print(f"\n测试{index}: {case.title}")
+        print(f"  {case.run_message}")
+        stores = []
+        for i in range(case.cycles):
             await ctx.tick()
+            if ctx.get(dut.dmem_wen_mon):
+                stores.append((ctx.get(dut.dmem_addr_mon), ctx.get(dut.dmem_wdata_mon)))
+            if case.probe_every and i % case.probe_every == 0:
+                pc = ctx.get(dut.debug_pc)
+                instr = ctx.get(dut.debug_instr)
+                print(f"  Cycle {i}: PC={pc:08X}, Instr={instr:08X}")
+
+        if tuple(stores) != case.expected_stores:
+            raise AssertionError(
+                f"测试{index} 存储序列不符: 期望 {case.expected_stores}, 实际 {tuple(stores)}"
+            )
+        print(f"✓ 测试{index}完成: {case.done_message}")
+
+        if index == len(SMOKE_CASES):
+            print("\n" + "=" * 60)
+            print("✓ 所有测试通过!")
+            print("=" * 60)
 
-        print("✓ 测试7完成: BEQ指令执行（无冒险）")
+    return SimulationSpec(dut=dut, bench=bench, vcd_path=f"cpu_test_{index}.vcd")
 
-        print("\n" + "=" * 60)
-        print("✓ 所有测试通过!")
-        print("=" * 60)
 
-    return SimulationSpec(dut=dut, bench=bench, vcd_path="cpu_test.vcd")
+def build_cpu_smoke_specs() -> List[SimulationSpec]:
+    """组合CPU的功能测试：每个程序一个全新的DUT。"""
+    return [
+        build_smoke_case_spec(index, case)
+        for index, case in enumerate(SMOKE_CASES, start=1)
+    ]
 
 
 def get_tests() -> list[SimulationTest]:
@@ -312,7 +363,7 @@ def get_tests() -> list[SimulationTest]:
             key="cpu-smoke",
             name="CPU Core Smoke",
             description="算术/逻辑/访存/移位指令的端到端功能测试。",
-            build=build_cpu_smoke_spec,
+            build=build_cpu_smoke_specs,
             tags=("cpu", "core"),
         )
     ]
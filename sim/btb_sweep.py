@@ -0,0 +1,102 @@
+"""
+BTB 容量扫描：在参考模型的分支轨迹上回放直接映射 BTB，比较不同表项数的命中率
+
+RTL 仿真每换一次 BranchTargetBuffer(size=...) 都要重新生成并运行整条流水线；
+BTB 的命中与否只取决于控制转移指令的 PC 和目标序列，因此先用 sim/refmodel.py
+跑一遍程序记录分支轨迹，再对每个容量回放这份轨迹。查找/更新规则与
+mips/core/cpu.py 中的 BranchTargetBuffer 一致：以 PC+4 为键、直接映射、
+只有跳转过的指令才写入表项。方向预测由 TwoLevelPredictor 负责，不在此统计。
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Sequence, Tuple
+import argparse
+import sys
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from amaranth.utils import exact_log2
+
+from sim import refmodel
+
+Branch = Tuple[int, int, bool, bool]
+
+
+@dataclass
+class BTBStats:
+    """一次回放的统计结果。"""
+
+    size: int
+    branches: int
+    taken: int
+    # 跳转的控制转移中，BTB 命中且目标正确的次数（取指阶段可直接重定向）
+    target_hits: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.target_hits / self.taken if self.taken else 0.0
+
+
+def simulate_btb(trace: Sequence[Branch], size: int) -> BTBStats:
+    """在分支轨迹上回放 size 项的直接映射 BTB。"""
+    index_bits = exact_log2(size)
+    mask = size - 1
+    # 每项为 (tag, target)，None 表示无效
+    entries: List = [None] * size
+    taken_count = 0
+    target_hits = 0
+
+    for pc, target, taken, _unconditional in trace:
+        word = ((pc + 4) & refmodel.MASK32) >> 2
+        index = word & mask
+        tag = word >> index_bits
+        if taken:
+            taken_count += 1
+            if entries[index] == (tag, target):
+                target_hits += 1
+            entries[index] = (tag, target)
+
+    return BTBStats(
+        size=size, branches=len(trace), taken=taken_count, target_hits=target_hits
+    )
+
+
+def sweep(trace: Sequence[Branch], sizes: Sequence[int]) -> List[BTBStats]:
+    """对每个容量回放同一份轨迹。"""
+    return [simulate_btb(trace, size) for size in sizes]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="在 Hamming 程序的分支轨迹上比较不同容量 BTB 的命中率",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[2, 4, 8, 16, 32, 64],
+        help="要比较的表项数，须为2的幂 (默认: 2 4 8 16 32 64)",
+    )
+    args = parser.parse_args()
+
+    from program.harming import build_hamming_program
+
+    artifact = build_hamming_program()
+    trace: List[Branch] = []
+    refmodel.run(artifact.words, stop_pc=artifact.done_pc, branches=trace)
+
+    print(f"分支轨迹: {len(trace)} 条控制转移指令")
+    for stats in sweep(trace, args.sizes):
+        print(
+            f"  size={stats.size:4d}: 跳转 {stats.taken} 次，"
+            f"BTB 命中 {stats.target_hits} 次 ({stats.hit_rate:.1%})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+使用 Verilator 编译并运行 CPU 冒烟测试
+
+Amaranth 的 Python 仿真器逐条解释每个信号赋值，周期数一多就成为瓶颈。
+本脚本为 `SMOKE_CASES` 中的每个程序单独导出一份 Verilog（程序作为指令
+内存初值固化在网表中），生成对应的 C++ 测试驱动 (sim_main.cpp)，再用
+Verilator 编译为本地可执行文件并依次运行。源码未变化时跳过重新编译。
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import shutil
+import subprocess
+import sys
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from amaranth.back import verilog
+
+from sim.benches.cpu_test import SMOKE_CASES, SmokeCase, build_test
+
+TOP_NAME = "top"
+
+SIM_MAIN_TEMPLATE = """\
+// 由 sim/build_verilator.py 自动生成，请勿手动修改
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+
+#include "V{top}.h"
+#include "verilated.h"
+#if VM_TRACE
+#include "verilated_vcd_c.h"
+#endif
+
+static V{top}* top = nullptr;
+#if VM_TRACE
+static VerilatedVcdC* tfp = nullptr;
+#endif
+static vluint64_t main_time = 0;
+
+static void half_cycle() {{
+    top->clk = !top->clk;
+    top->eval();
+#if VM_TRACE
+    if (tfp) tfp->dump(main_time);
+#endif
+    main_time++;
+}}
+
+static void tick() {{
+    half_cycle();
+    half_cycle();
+}}
+
+int main(int argc, char** argv) {{
+    Verilated::commandArgs(argc, argv);
+    top = new V{top};
+    top->clk = 0;
+    top->rst = 0;
+    top->eval();
+
+#if VM_TRACE
+    bool trace = false;
+    for (int i = 1; i < argc; i++) {{
+        if (std::strcmp(argv[i], "--trace") == 0) trace = true;
+    }}
+    if (trace) {{
+        Verilated::traceEverOn(true);
+        tfp = new VerilatedVcdC;
+        top->trace(tfp, 99);
+        tfp->open("{vcd}");
+    }}
+#endif
+
+{body}
+#if VM_TRACE
+    if (tfp) {{
+        tfp->close();
+        delete tfp;
+    }}
+#endif
+    top->final();
+    delete top;
+    return 0;
+}}
+"""
+
+
+def _c_string(text: str) -> str:
+    """转义为 C 字符串字面量内容。"""
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("%", "%%")
+
+
+HEADER = """\
+    std::printf("============================================================\\n");
+    std::printf("CPU测试开始 - 无冒险场景\\n");
+    std::printf("============================================================\\n");
+"""
+
+FOOTER = """\
+    std::printf("\\n============================================================\\n");
+    std::printf("✓ 所有测试通过!\\n");
+    std::printf("============================================================\\n");
+"""
+
+
+def render_case(index: int, case: SmokeCase) -> str:
+    """把 cpu_test.py 中 bench 协程的一个测试步骤翻译为 C++。"""
+    expected = ", ".join(f"{{0x{addr:X}u, 0x{data:X}u}}" for addr, data in case.expected_stores)
+    lines = [
+        f'    std::printf("\\n测试{index}: {_c_string(case.title)}\\n");',
+        f'    std::printf("  {_c_string(case.run_message)}\\n");',
+        # 与 Python 测试台一致：逐周期记录数据存储，结束后与期望序列比较
+        f"    static const uint32_t expected[][2] = {{{expected}}};",
+        f"    const int expected_count = {len(case.expected_stores)};",
+        "    int stored = 0;",
+        "    bool stores_ok = true;",
+        f"    for (int i = 0; i < {case.cycles}; i++) {{",
+        "        tick();",
+        "        if (top->dmem_wen_mon) {",
+        "            if (stored >= expected_count",
+        "                || top->dmem_addr_mon != expected[stored][0]",
+        "                || top->dmem_wdata_mon != expected[stored][1]) {",
+        "                stores_ok = false;",
+        "            }",
+        "            stored++;",
+        "        }",
+    ]
+    if case.probe_every:
+        lines += [
+            f"        if (i % {case.probe_every} == 0) {{",
+            '            std::printf("  Cycle %d: PC=%08X, Instr=%08X\\n", i,',
+            "                        (unsigned)top->debug_pc, (unsigned)top->debug_instr);",
+            "        }",
+        ]
+    lines += [
+        "    }",
+        "    if (!stores_ok || stored != expected_count) {",
+        f'        std::printf("✗ 测试{index} 存储序列不符\\n");',
+        "#if VM_TRACE",
+        "        if (tfp) tfp->close();",
+        "#endif",
+        "        top->final();",
+        "        delete top;",
+        "        return 1;",
+        "    }",
+        f'    std::printf("✓ 测试{index}完成: {_c_string(case.done_message)}\\n");',
+    ]
+    body = "\n".join(lines) + "\n"
+    if index == 1:
+        body = HEADER + body
+    if index == len(SMOKE_CASES):
+        body += FOOTER
+    return body
+
+
+def generate_sources(index: int, case: SmokeCase, case_dir: Path) -> tuple[Path, Path]:
+    """为单个测试程序生成 top.v 和 sim_main.cpp，返回二者路径。"""
+    case_dir.mkdir(parents=True, exist_ok=True)
+
+    # 程序作为存储器初值直接写进网表，不再需要加载端口和地址选择器
+    verilog_text = verilog.convert(build_test(case.program), name=TOP_NAME)
+    verilog_file = case_dir / f"{TOP_NAME}.v"
+    verilog_file.write_text(verilog_text, encoding="utf-8")
+
+    harness = SIM_MAIN_TEMPLATE.format(
+        top=TOP_NAME, body=render_case(index, case), vcd=f"cpu_test_{index}.vcd"
+    )
+    harness_file = case_dir / "sim_main.cpp"
+    harness_file.write_text(harness, encoding="utf-8")
+    print(f"✓ 测试{index} 源码已生成: {case_dir}")
+
+    return verilog_file, harness_file
+
+
+def build_case(index: int, case: SmokeCase, output_dir: Path, trace: bool = False) -> Path:
+    """调用 Verilator 编译单个测试程序的模型，返回可执行文件路径。"""
+    case_dir = output_dir / f"case_{index}"
+    verilog_file, harness_file = generate_sources(index, case, case_dir)
+    obj_dir = case_dir / "obj_dir"
+    executable = obj_dir / f"V{TOP_NAME}"
+    command = [
+        "verilator",
+        "--cc",
+        "--exe",
+        "--build",
+        "-O3",
+        "--x-assign",
+        "fast",
+        "-Wno-fatal",
+        "--top-module",
+        TOP_NAME,
+        "--Mdir",
+        str(obj_dir),
+        "-CFLAGS",
+        "-O3 -march=native",
+    ]
+    if trace:
+        # 只有显式要求时才编译波形支持，避免 VCD 写入开销
+        command.append("--trace")
+    command += [str(verilog_file), str(harness_file)]
+
+    # 以网表、测试驱动和编译命令的哈希作为缓存键，未变化时直接复用上次的模型
+    digest = hashlib.sha1()
+    digest.update(verilog_file.read_bytes())
+    digest.update(harness_file.read_bytes())
+    digest.update("\0".join(command).encode("utf-8"))
+    stamp = obj_dir / "source.sha1"
+    if executable.exists() and stamp.exists() and stamp.read_text() == digest.hexdigest():
+        print(f"✓ 测试{index} 未变化，复用已编译的模型")
+        return executable
+
+    subprocess.run(command, check=True)
+    stamp.write_text(digest.hexdigest())
+    return executable
+
+
+def build(output_dir: Path, trace: bool = False) -> list[Path]:
+    """为每个测试程序编译一个专用模型，按测试顺序返回可执行文件路径。"""
+    if shutil.which("verilator") is None:
+        raise RuntimeError("未找到 verilator，请先安装 Verilator 并加入 PATH")
+
+    print("编译 Verilator 模型...")
+    executables = [
+        build_case(index, case, output_dir, trace)
+        for index, case in enumerate(SMOKE_CASES, start=1)
+    ]
+    print(f"✓ 已生成 {len(executables)} 个可执行文件")
+    return executables
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="使用 Verilator 编译并运行 CPU 冒烟测试",
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default="build/verilator",
+        help="输出目录 (默认: build/verilator)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="编译波形支持并在运行时输出 cpu_test_<N>.vcd",
+    )
+    parser.add_argument(
+        "--no-run",
+        action="store_true",
+        help="只生成并编译，不运行仿真",
+    )
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    try:
+        executables = build(output_dir, trace=args.trace)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"\n✗ 错误: {e}")
+        return 1
+
+    if args.no_run:
+        return 0
+
+    for executable in executables:
+        run_args = [str(executable.resolve())]
+        if args.trace:
+            run_args.append("--trace")
+        returncode = subprocess.run(run_args, cwd=output_dir).returncode
+        if returncode != 0:
+            return returncode
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
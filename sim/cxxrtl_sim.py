@@ -0,0 +1,292 @@
+"""
+使用 CXXRTL 编译模型代替 pysim 运行测试台
+
+pysim 每个周期都要在 Python 中逐个进程求值，是仿真的主要开销。本模块借助
+amaranth-yosys 自带的 CXXRTL 后端把 DUT 转换为 C++，用 g++ 编译为共享库，
+再通过 CXXRTL 的 C API（ctypes）驱动。测试台看到的仍是 set/get/tick 接口，
+因此 SimulationSpec 中现有的 bench 协程无需修改即可运行。
+
+与 sim/build_verilator.py 不同，这里只需要 g++，不依赖 Verilator。
+测试台只能访问顶层端口，且只支持 ctx.set/ctx.get/ctx.tick()。
+
+支持两步式的 profile-guided optimization：先用 --pgo generate 运行一次，
+插桩的模型在进程退出时写出分支计数；再用 --pgo use 按计数重新编译运行。
+"""
+
+from pathlib import Path
+import argparse
+import ctypes
+import hashlib
+import shutil
+import subprocess
+import sys
+from typing import Optional
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import amaranth_yosys
+from amaranth.back import cxxrtl
+
+from sim.test_utils import SimulationSpec
+
+RUNTIME_INCLUDE = (
+    Path(amaranth_yosys.__file__).parent
+    / "share"
+    / "include"
+    / "backends"
+    / "cxxrtl"
+    / "runtime"
+)
+
+
+# 追加到生成代码末尾：整段时钟推进循环在本地代码中完成，每次 tick(n) 只需一次 ctypes 调用
+TICK_LOOP_SOURCE = """
+extern "C" void cxxrtl_sim_tick(cxxrtl_handle handle, uint32_t *clock, size_t count) {
+	for (size_t i = 0; i < count; i++) {
+		*clock = 1;
+		cxxrtl_step(handle);
+		// 提交上升沿后组合输出尚未按新状态求值，下降沿的这次求值使其稳定
+		*clock = 0;
+		cxxrtl_step(handle);
+	}
+}
+"""
+
+
+class _CXXRTLObject(ctypes.Structure):
+    """对应 cxxrtl_capi.h 中的 struct cxxrtl_object。"""
+
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("width", ctypes.c_size_t),
+        ("lsb_at", ctypes.c_size_t),
+        ("depth", ctypes.c_size_t),
+        ("zero_at", ctypes.c_size_t),
+        ("curr", ctypes.POINTER(ctypes.c_uint32)),
+        ("next", ctypes.POINTER(ctypes.c_uint32)),
+        ("outline", ctypes.c_void_p),
+        ("attrs", ctypes.c_void_p),
+    ]
+
+
+PGO_MODES = ("generate", "use")
+
+
+def compile_model(
+    dut, build_dir: Path, name: str = "top", pgo: Optional[str] = None
+) -> Path:
+    """把 DUT 转换为 CXXRTL C++ 并编译为共享库，返回库文件路径。
+
+    库文件名带有源码哈希，源码未变时直接复用上次的编译结果。
+    pgo 为 "generate" 时编译插桩版本，计数写入 build_dir/pgo；为 "use" 时
+    按已有计数优化编译，库文件名中再加上计数文件的哈希。
+    """
+    if shutil.which("g++") is None:
+        raise RuntimeError("未找到 g++，无法编译 CXXRTL 模型")
+
+    source = cxxrtl.convert(dut, name=name) + TICK_LOOP_SOURCE
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    build_dir.mkdir(parents=True, exist_ok=True)
+    # 计数文件名由 -dumpbase 决定，固定它才能让插桩和优化两次编译对上同一份计数
+    dumpbase = build_dir.resolve() / f"{name}_{digest}"
+    profile_dir = build_dir.resolve() / "pgo"
+
+    pgo_flags = []
+    tag = ""
+    if pgo == "generate":
+        pgo_flags = [f"-fprofile-generate={profile_dir}"]
+        tag = "_pgogen"
+    elif pgo == "use":
+        profiles = sorted(profile_dir.rglob(f"{dumpbase.name}*.gcda"))
+        if not profiles:
+            raise RuntimeError("没有找到分支计数，请先用 --pgo generate 运行一次")
+        profile_digest = hashlib.sha1()
+        for profile in profiles:
+            profile_digest.update(profile.read_bytes())
+        pgo_flags = [f"-fprofile-use={profile_dir}", "-fprofile-correction"]
+        tag = f"_pgo{profile_digest.hexdigest()[:12]}"
+
+    library = build_dir / f"lib{name}_{digest}{tag}.so"
+    if library.exists():
+        return library
+
+    source_file = build_dir / f"{name}_{digest}.cc"
+    source_file.write_text(source, encoding="utf-8")
+    subprocess.run(
+        [
+            "g++",
+            "-std=c++14",
+            "-O2",
+            "-shared",
+            "-fPIC",
+            *pgo_flags,
+            "-dumpbase",
+            str(dumpbase),
+            "-DCXXRTL_INCLUDE_CAPI_IMPL",
+            "-I",
+            str(RUNTIME_INCLUDE),
+            "-o",
+            str(library),
+            str(source_file),
+        ],
+        check=True,
+    )
+    return library
+
+
+class CXXRTLModel:
+    """通过 C API 访问已编译的 CXXRTL 设计。"""
+
+    def __init__(self, library: Path, clock: str = "clk"):
+        self._lib = lib = ctypes.CDLL(str(library))
+        lib.cxxrtl_design_create.restype = ctypes.c_void_p
+        lib.cxxrtl_create.restype = ctypes.c_void_p
+        lib.cxxrtl_create.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_destroy.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_step.restype = ctypes.c_size_t
+        lib.cxxrtl_step.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_get_parts.restype = ctypes.POINTER(_CXXRTLObject)
+        lib.cxxrtl_get_parts.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_size_t),
+        ]
+        lib.cxxrtl_outline_eval.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_sim_tick.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_uint32),
+            ctypes.c_size_t,
+        ]
+
+        self._handle = lib.cxxrtl_create(lib.cxxrtl_design_create())
+        self._objects = {}
+        self._clock = self._lookup(clock)
+        self._write(self._clock, 0)
+        lib.cxxrtl_step(self._handle)
+
+    def _lookup(self, name: str) -> _CXXRTLObject:
+        obj = self._objects.get(name)
+        if obj is None:
+            parts = ctypes.c_size_t(0)
+            ptr = self._lib.cxxrtl_get_parts(
+                self._handle, name.encode("utf-8"), ctypes.byref(parts)
+            )
+            if not ptr or parts.value != 1:
+                raise KeyError(f"CXXRTL 设计中没有名为 {name!r} 的顶层信号")
+            obj = self._objects[name] = ptr.contents
+        return obj
+
+    @staticmethod
+    def _chunks(obj: _CXXRTLObject) -> int:
+        return (obj.width + 31) // 32
+
+    def _write(self, obj: _CXXRTLObject, value: int) -> None:
+        if not obj.next:
+            raise ValueError("该信号由常量驱动，不能写入")
+        for i in range(self._chunks(obj)):
+            obj.next[i] = (value >> (32 * i)) & 0xFFFFFFFF
+
+    def get(self, name: str) -> int:
+        obj = self._lookup(name)
+        if obj.outline:
+            # 调试信号按需求值
+            self._lib.cxxrtl_outline_eval(obj.outline)
+        value = 0
+        for i in range(self._chunks(obj)):
+            value |= obj.curr[i] << (32 * i)
+        return value
+
+    def set(self, name: str, value: int) -> None:
+        self._write(self._lookup(name), value)
+        self._lib.cxxrtl_step(self._handle)
+
+    def tick(self, count: int = 1) -> None:
+        """推进 count 个时钟周期，返回时上升沿已生效且组合逻辑已稳定。"""
+        self._lib.cxxrtl_sim_tick(self._handle, self._clock.next, count)
+
+    def close(self) -> None:
+        if self._handle:
+            self._lib.cxxrtl_destroy(self._handle)
+            self._handle = None
+
+
+class _Tick:
+    """可等待的时钟推进，行为与 pysim 的 ctx.tick() 一致（含 repeat）。"""
+
+    def __init__(self, model: CXXRTLModel, count: int = 1):
+        self._model = model
+        self._count = count
+
+    def repeat(self, count: int) -> "_Tick":
+        return _Tick(self._model, self._count * count)
+
+    def __await__(self):
+        self._model.tick(self._count)
+        return
+        yield  # 使 __await__ 成为生成器，但从不挂起
+
+
+class CXXRTLContext:
+    """把 pysim 测试台上下文的 set/get/tick 映射到 CXXRTL 模型的顶层端口。"""
+
+    def __init__(self, model: CXXRTLModel):
+        self._model = model
+
+    def set(self, signal, value: int) -> None:
+        self._model.set(signal.name, value)
+
+    def get(self, signal) -> int:
+        return self._model.get(signal.name)
+
+    def tick(self) -> _Tick:
+        return _Tick(self._model)
+
+
+def run_spec(spec: SimulationSpec, build_dir: Path, pgo: Optional[str] = None) -> None:
+    """用 CXXRTL 模型运行一个 SimulationSpec 的 bench 协程。"""
+    model = CXXRTLModel(compile_model(spec.dut, build_dir, pgo=pgo))
+    try:
+        coroutine = spec.bench(CXXRTLContext(model))
+        try:
+            coroutine.send(None)
+        except StopIteration:
+            return
+        coroutine.close()
+        raise RuntimeError("测试台等待了 CXXRTL 后端不支持的事件")
+    finally:
+        model.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="使用 CXXRTL 编译模型运行 CPU 冒烟测试",
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default="build/cxxrtl",
+        help="编译输出目录 (默认: build/cxxrtl)",
+    )
+    parser.add_argument(
+        "--pgo",
+        choices=PGO_MODES,
+        help="generate: 编译插桩模型并收集分支计数；use: 按计数重新编译",
+    )
+    args = parser.parse_args()
+
+    from sim.benches.cpu_test import build_cpu_smoke_specs
+
+    try:
+        for spec in build_cpu_smoke_specs():
+            run_spec(spec, Path(args.output), args.pgo)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"\n✗ 错误: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
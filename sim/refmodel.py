@@ -0,0 +1,227 @@
+"""
+指令级参考模型：用纯 Python 逐条执行程序，给出 RTL 应当产生的结果
+
+流水线的 RTL 仿真每个周期都要求值整条流水线；参考模型只关心体系结构状态
+（寄存器、PC、存储器写），适合对长程序做离线比对。程序在运行前被预译码为
+(类别, 字段...) 元组，热循环里只剩整数运算和一次按类别的分派，不再逐条切位。
+
+语义与 mips/core/cpu.py 保持一致：没有分支延迟槽，ADD/SUB 溢出不产生异常，
+译码表中未列出的 funct 按 ADD 写回 rd，未列出的 opcode 当作 NOP。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import sys
+
+# 添加项目根目录到 Python 路径
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from mips.core.cpu import FUNCT_CONTROL, OPCODE_CONTROL, Funct, Opcode
+
+MASK32 = 0xFFFFFFFF
+
+# 预译码后的指令类别
+(
+    K_NOP,
+    K_ADD,
+    K_SUB,
+    K_AND,
+    K_OR,
+    K_SLT,
+    K_SLL,
+    K_SRL,
+    K_JR,
+    K_ADDI,
+    K_ANDI,
+    K_ORI,
+    K_SLTI,
+    K_LW,
+    K_SW,
+    K_BEQ,
+    K_BNE,
+    K_J,
+    K_JAL,
+) = range(19)
+
+FUNCT_KINDS = {
+    Funct.ADD: K_ADD,
+    Funct.SUB: K_SUB,
+    Funct.AND: K_AND,
+    Funct.OR: K_OR,
+    Funct.SLT: K_SLT,
+    Funct.SLL: K_SLL,
+    Funct.SRL: K_SRL,
+    Funct.JR: K_JR,
+}
+
+OPCODE_KINDS = {
+    Opcode.ADDI: K_ADDI,
+    Opcode.ANDI: K_ANDI,
+    Opcode.ORI: K_ORI,
+    Opcode.SLTI: K_SLTI,
+    Opcode.LW: K_LW,
+    Opcode.SW: K_SW,
+    Opcode.BEQ: K_BEQ,
+    Opcode.BNE: K_BNE,
+    Opcode.J: K_J,
+    Opcode.JAL: K_JAL,
+}
+
+# 参考模型与 RTL 译码表覆盖的指令必须一致，新增指令时两边要一起改
+assert set(FUNCT_KINDS) == set(FUNCT_CONTROL)
+assert set(OPCODE_KINDS) - {Opcode.BEQ, Opcode.BNE, Opcode.J} == set(OPCODE_CONTROL) - {
+    Opcode.R_TYPE
+}
+
+
+@dataclass
+class ReferenceResult:
+    """参考模型运行结束时的体系结构状态。"""
+
+    regs: List[int]
+    pc: int
+    retired: int
+    # 按发生顺序记录的存储器写 (地址, 数据)
+    writes: List[Tuple[int, int]] = field(default_factory=list)
+
+
+def _sext16(value: int) -> int:
+    return (value & 0x7FFF) - (value & 0x8000)
+
+
+def _signed(value: int) -> int:
+    return (value & 0x7FFFFFFF) - (value & 0x80000000)
+
+
+def predecode(word: int) -> tuple:
+    """把一条指令字译为 (类别, rs, rt, 目的/立即数...) 元组。"""
+    opcode = (word >> 26) & 0x3F
+    rs = (word >> 21) & 0x1F
+    rt = (word >> 16) & 0x1F
+    if opcode == Opcode.R_TYPE:
+        rd = (word >> 11) & 0x1F
+        shamt = (word >> 6) & 0x1F
+        kind = FUNCT_KINDS.get(word & 0x3F, K_ADD)
+        return (kind, rs, rt, rd, shamt)
+    kind = OPCODE_KINDS.get(opcode, K_NOP)
+    if kind in (K_J, K_JAL):
+        return (kind, 0, 0, (word & 0x3FFFFFF) << 2, 0)
+    imm = word & 0xFFFF
+    if kind not in (K_ANDI, K_ORI):
+        imm = _sext16(imm) & MASK32
+    return (kind, rs, rt, imm, 0)
+
+
+def run(
+    program: Sequence[int],
+    *,
+    stop_pc: Optional[int] = None,
+    max_steps: int = 1_000_000,
+    dmem: Optional[Dict[int, int]] = None,
+    branches: Optional[List[Tuple[int, int, bool, bool]]] = None,
+) -> ReferenceResult:
+    """从 PC=0 开始执行 program，直到 PC 到达 stop_pc 或执行满 max_steps 条指令。
+
+    dmem 为按字节地址索引的数据存储器初值（缺省为全 0），SW 会写回其中。
+    给出 branches 时，按执行顺序追加 BEQ/BNE/J/JAL 的
+    (PC, 跳转目标, 是否跳转, 是否无条件) 记录，供 BTB 等离线分析使用。
+    """
+    decoded = [predecode(word) for word in program]
+    nop = (K_NOP, 0, 0, 0, 0)
+    size = len(decoded)
+    regs = [0] * 32
+    memory = dict(dmem) if dmem else {}
+    writes: List[Tuple[int, int]] = []
+    append_write = writes.append
+    pc = 0
+    retired = 0
+
+    while retired < max_steps and pc != stop_pc:
+        index = pc >> 2
+        kind, rs, rt, x, shamt = decoded[index] if index < size else nop
+        next_pc = (pc + 4) & MASK32
+        dest = 0
+        value = 0
+
+        if kind <= K_JR:
+            a = regs[rs]
+            b = regs[rt]
+            dest = x
+            if kind == K_ADD:
+                value = a + b
+            elif kind == K_SUB:
+                value = a - b
+            elif kind == K_AND:
+                value = a & b
+            elif kind == K_OR:
+                value = a | b
+            elif kind == K_SLT:
+                value = int(_signed(a) < _signed(b))
+            elif kind == K_SLL:
+                value = b << shamt
+            elif kind == K_SRL:
+                value = b >> shamt
+            elif kind == K_JR:
+                next_pc = a
+                dest = 0
+            else:  # K_NOP
+                dest = 0
+        elif kind <= K_SLTI:
+            a = regs[rs]
+            dest = rt
+            if kind == K_ADDI:
+                value = a + x
+            elif kind == K_ANDI:
+                value = a & x
+            elif kind == K_ORI:
+                value = a | x
+            else:
+                value = int(_signed(a) < _signed(x))
+        elif kind == K_LW:
+            dest = rt
+            value = memory.get((regs[rs] + x) & MASK32, 0)
+        elif kind == K_SW:
+            addr = (regs[rs] + x) & MASK32
+            memory[addr] = regs[rt]
+            append_write((addr, regs[rt]))
+        elif kind <= K_BNE:
+            target = (next_pc + (x << 2)) & MASK32
+            taken = (regs[rs] == regs[rt]) == (kind == K_BEQ)
+            if branches is not None:
+                branches.append((pc, target, taken, False))
+            if taken:
+                next_pc = target
+        else:  # K_J / K_JAL
+            if kind == K_JAL:
+                dest = 31
+                value = next_pc
+            next_pc = (next_pc & 0xF0000000) | x
+            if branches is not None:
+                branches.append((pc, next_pc, True, True))
+
+        if dest:
+            regs[dest] = value & MASK32
+        pc = next_pc
+        retired += 1
+
+    return ReferenceResult(regs=regs, pc=pc, retired=retired, writes=writes)
+
+
+def main() -> int:
+    from program.harming import build_hamming_program
+
+    artifact = build_hamming_program()
+    result = run(artifact.words, stop_pc=artifact.done_pc)
+    print(f"参考模型执行 {result.retired} 条指令后到达 PC=0x{result.pc:08X}")
+    for addr, data in result.writes:
+        print(f"  addr=0x{addr:08X} data=0x{data:08X}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,12 +7,14 @@ import sys
 import textwrap
 import time
 import traceback
-from dataclasses import dataclass
-from typing import Awaitable, Callable, Iterable, List, Optional
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence, Union
 
 from amaranth import Elaboratable
 from amaranth.sim import Simulator
 
+from mips.trace import trace_enabled
+
 BenchCoroutine = Callable[..., Awaitable[None]]
 
 
@@ -24,6 +26,18 @@ class SimulationSpec:
     bench: BenchCoroutine
     clock_period: float = 1e-6
     vcd_path: Optional[str] = None
+    # 首次运行时构建的仿真器；spec 被复用时直接 reset 后重跑，免去重新细化
+    simulator: Optional[Simulator] = field(default=None, repr=False, compare=False)
+
+    def prepare_simulator(self) -> Simulator:
+        """Return this spec's simulator, building it on first use."""
+        if self.simulator is None:
+            self.simulator = Simulator(self.dut)
+            self.simulator.add_clock(self.clock_period)
+            self.simulator.add_testbench(self.bench)
+        else:
+            self.simulator.reset()
+        return self.simulator
 
 
 @dataclass
@@ -33,7 +47,7 @@ class SimulationTest:
     key: str
     name: str
     description: str
-    build: Callable[[], SimulationSpec]
+    build: Callable[[], Union[SimulationSpec, Sequence[SimulationSpec]]]
     tags: tuple[str, ...] = ()
 
     def run(self, *, capture: bool = True) -> "TestResult":
@@ -49,18 +63,23 @@ class SimulationTest:
         error: Optional[BaseException] = None
 
         try:
-            spec = self.build()
-            simulator = Simulator(spec.dut)
-            simulator.add_clock(spec.clock_period)
-            simulator.add_testbench(spec.bench)
+            specs = self.build()
+            if isinstance(specs, SimulationSpec):
+                specs = [specs]
 
             with stdout_cm:
-                vcd_path = spec.vcd_path
-                if vcd_path:
-                    with simulator.write_vcd(vcd_path):
+                # 每个 spec 使用独立的仿真器（例如每个测试程序一个新的DUT）
+                for spec in specs:
+                    simulator = spec.prepare_simulator()
+
+                    # VCD 写出开销很大，只在显式要求时开启
+                    trace_cm = (
+                        simulator.write_vcd(spec.vcd_path)
+                        if spec.vcd_path and trace_enabled()
+                        else contextlib.nullcontext()
+                    )
+                    with trace_cm:
                         simulator.run()
-                else:
-                    simulator.run()
         except BaseException as exc:  # noqa: BLE001 - need to capture everything
             error = exc
 
@@ -32,10 +32,12 @@ def print_hierarchy(elaboratable, name="top", indent=0):
                 ("pc", "PC"),
                 ("pc_controller", "PCController"),
                 ("regfile", "RegFile"),
-                ("forwarding_unit_rs", "ForwardingUnit"),
-                ("forwarding_unit_rt", "ForwardingUnit"),
+                ("forwarding_unit_id_rs", "ForwardingUnit"),
+                ("forwarding_unit_id_rt", "ForwardingUnit"),
                 ("hazard_detection_rs", "HazardDetectionUnit"),
                 ("hazard_detection_rt", "HazardDetectionUnit"),
+                ("btb", "BranchTargetBuffer"),
+                ("predictor", "TwoLevelPredictor"),
                 ("fetch_stage", "InstructionFetchStage"),
                 ("if_id_reg", "IFIDRegister"),
                 ("decode_stage", "InstructionDecodeStage"),